@@ -4,6 +4,8 @@ Table Loading script
 ===============================================================================
 Script Purpose:
     This script will load the dim_date table as it is a static dimension table
+    Optional initial seed: load.py (python.extend_dim_date) extends dim_date to the
+    dates of every staged batch before the fact load, in whole calendar years
 ===============================================================================
 */
 
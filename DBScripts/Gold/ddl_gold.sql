@@ -28,6 +28,7 @@ CREATE TABLE Gold.dim_account (
 	start_date				DATE,
 	end_date				DATE,
 	current_flag			BIT,
+	row_hash				CHAR(32),		--Hash of the SCD2 tracked attributes, compared instead of every column
 	UNIQUE(account_id, start_date) 
 );
 
@@ -5,13 +5,17 @@ Stored Procedure
 Script Purpose:
     This will create the stored procedure to load data in Gold.dim_account table
 	from Silver.stg_account and implement SCD type 2 on it
+	Only the rows of the given load batch are read
+	Changes are detected by comparing row_hash (computed in the silver stage)
 ===============================================================================
 */
 --Select * from Gold.dim_account
 CREATE OR ALTER PROCEDURE Gold.sp_upsert_dim_account
+    @load_batch_id VARCHAR(40)
 AS
 BEGIN
     SET NOCOUNT ON;
+    DECLARE @rows INT = 0;
 
     -- Temp table for incoming data from Silver layer
     CREATE TABLE #incoming (
@@ -22,11 +26,12 @@ BEGIN
         type                    VARCHAR(50),
         subtype                 VARCHAR(50),
         holder_category         VARCHAR(100),
-        currency_code           VARCHAR(10)
+        currency_code           VARCHAR(10),
+        row_hash                CHAR(32)
     );
 
     -- Load latest data from Silver layer
-    INSERT INTO #incoming (account_id, mask, name, official_name, type, subtype, holder_category, currency_code)
+    INSERT INTO #incoming (account_id, mask, name, official_name, type, subtype, holder_category, currency_code, row_hash)
     SELECT 
         account_id,
         mask,
@@ -35,19 +40,20 @@ BEGIN
         type,
         subtype,
         holder_category,
-        balances_iso_currency_code
-    FROM Silver.stg_accounts;
+        balances_iso_currency_code,
+        row_hash
+    FROM Silver.stg_accounts
+    WHERE load_batch_id = @load_batch_id;
 
-    -- Step 1: Expire old records if there's a change
+    -- Step 0: Rows loaded before row_hash existed get the hash once if nothing changed,
+    -- after that every comparison below is a single column
     UPDATE dim
-    SET 
-        end_date = GETDATE(),
-        current_flag = 0,
-        is_active = 0
+    SET row_hash = inc.row_hash
     FROM Gold.dim_account dim
     INNER JOIN #incoming inc ON dim.account_id = inc.account_id
     WHERE dim.current_flag = 1
-      AND (
+      AND dim.row_hash IS NULL
+      AND NOT (
           ISNULL(dim.mask, '') <> ISNULL(inc.mask, '') OR
           ISNULL(dim.name, '') <> ISNULL(inc.name, '') OR
           ISNULL(dim.official_name, '') <> ISNULL(inc.official_name, '') OR
@@ -57,11 +63,22 @@ BEGIN
           ISNULL(dim.currency_code, '') <> ISNULL(inc.currency_code, '')
       );
 
+    -- Step 1: Expire old records if there's a change
+    UPDATE dim
+    SET 
+        end_date = GETDATE(),
+        current_flag = 0,
+        is_active = 0
+    FROM Gold.dim_account dim
+    INNER JOIN #incoming inc ON dim.account_id = inc.account_id
+    WHERE dim.current_flag = 1
+      AND ISNULL(dim.row_hash, '') <> inc.row_hash;
+
     -- Step 2: Insert new records (new or changed)
     INSERT INTO Gold.dim_account (
         account_id, mask, name, official_name, type, subtype,
         holder_category, currency_code, is_active,
-        start_date, end_date, current_flag
+        start_date, end_date, current_flag, row_hash
     )
     SELECT 
         inc.account_id,
@@ -75,21 +92,17 @@ BEGIN
         1,                -- is_active
         GETDATE(),        -- start_date
         NULL,             -- end_date
-        1                 -- current_flag
+        1,                -- current_flag
+        inc.row_hash
     FROM #incoming inc
     LEFT JOIN Gold.dim_account dim
         ON inc.account_id = dim.account_id AND dim.current_flag = 1
-    WHERE dim.account_id IS NULL OR
-          (
-            ISNULL(dim.mask, '') <> ISNULL(inc.mask, '') OR
-            ISNULL(dim.name, '') <> ISNULL(inc.name, '') OR
-            ISNULL(dim.official_name, '') <> ISNULL(inc.official_name, '') OR
-            ISNULL(dim.type, '') <> ISNULL(inc.type, '') OR
-            ISNULL(dim.subtype, '') <> ISNULL(inc.subtype, '') OR
-            ISNULL(dim.holder_category, '') <> ISNULL(inc.holder_category, '') OR
-            ISNULL(dim.currency_code, '') <> ISNULL(inc.currency_code, '')
-          );
+    WHERE dim.account_id IS NULL OR ISNULL(dim.row_hash, '') <> inc.row_hash;
+    SET @rows = @@ROWCOUNT;
 
     DROP TABLE #incoming;
+
+    -- Number of new account versions, read by load.py for the run metadata
+    SELECT @rows AS rows_affected;
 END;
 GO
@@ -5,10 +5,12 @@ Stored Procedure
 Script Purpose:
     This will create the stored procedure to load data in Gold.dim_category table
 	from Silver.stg_transaction and implement SCD type 2 on it
+	Only the rows of the given load batch are read
 ===============================================================================
 */
 --Select * from Gold.dim_category
 CREATE OR ALTER PROCEDURE Gold.sp_load_dim_category
+    @load_batch_id VARCHAR(40)
 AS
 BEGIN
     SET NOCOUNT ON;
@@ -22,5 +24,9 @@ BEGIN
     LEFT JOIN Gold.dim_category dim
         ON ISNULL(stg.personal_finance_category_primary, '') = ISNULL(dim.primary_category, '')
         AND ISNULL(stg.personal_finance_category_detailed, '') = ISNULL(dim.detailed_category, '')
-    WHERE dim.category_sk IS NULL;
+    WHERE stg.load_batch_id = @load_batch_id
+      AND dim.category_sk IS NULL;
+
+    -- Number of new categories, read by load.py for the run metadata
+    SELECT @@ROWCOUNT AS rows_affected;
 END;
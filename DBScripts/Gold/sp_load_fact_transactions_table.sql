@@ -5,49 +5,114 @@ Stored Procedure
 Script Purpose:
     This will create the stored procedure to load data in Gold.fact_transactions table
 	from Silver.stg_transaction and joining it to dim_account,dim_category and dim_date tables
+	Only the rows of the given load batch are read
+	New transactions are inserted, changed ones updated and the ones in
+	Silver.stg_removed_transactions deleted. Every row written is logged in
+	Gold.fact_transaction_changes with sign 1, every row replaced or deleted with
+	sign -1, in the same transaction, so the reporting aggregates follow.
 ===============================================================================
 */
 --SELECT * FROM Gold.fact_transactions
 CREATE OR ALTER PROCEDURE Gold.sp_load_fact_transactions
+    @load_batch_id VARCHAR(40)
 AS
 BEGIN
     SET NOCOUNT ON;
+    SET XACT_ABORT ON;
 
-    INSERT INTO Gold.fact_transactions (
-        transaction_id,
-        account_sk,
-        date_sk,
-        merchant_name,
-        amount,
-        currency_code,
-        payment_channel,
-        category_sk,
-        pending_flag,
-        created_at
-    )
-    SELECT
-        st.transaction_id,
-        da.account_sk,
-        dd.date_sk,
-        LOWER(LTRIM(RTRIM(st.merchant_name))),
-        st.amount,
-        ISNULL(st.iso_currency_code, 'USD'),
-        ISNULL(st.payment_channel, 'online'),
-        dc.category_sk,
-        CASE WHEN st.pending = 1 THEN 1 ELSE 0 END,
-        GETDATE()
-    FROM Silver.stg_transactions st
-    INNER JOIN Gold.dim_account da
-        ON st.account_id = da.account_id
-        AND da.current_flag = 1
-    INNER JOIN Gold.dim_date dd
-        ON CAST(st.date AS DATE) = dd.date
-    LEFT JOIN Gold.dim_category dc
-        ON ISNULL(st.personal_finance_category_primary, '') = ISNULL(dc.primary_category, '')
-        AND ISNULL(st.personal_finance_category_detailed, '') = ISNULL(dc.detailed_category, '')
-    WHERE NOT EXISTS (
-        SELECT 1
-        FROM Gold.fact_transactions ft
-        WHERE ft.transaction_id = st.transaction_id
+    DECLARE @changes TABLE (
+        action                  NVARCHAR(10),
+        transaction_id          VARCHAR(100),
+        old_account_sk          INT,
+        old_date_sk             INT,
+        old_merchant_name       VARCHAR(255),
+        old_amount              DECIMAL(18,2),
+        old_category_sk         INT,
+        old_pending_flag        BIT,
+        new_account_sk          INT,
+        new_date_sk             INT,
+        new_merchant_name       VARCHAR(255),
+        new_amount              DECIMAL(18,2),
+        new_category_sk         INT,
+        new_pending_flag        BIT
     );
+
+    BEGIN TRANSACTION;
+
+    MERGE Gold.fact_transactions AS ft
+    USING (
+        SELECT
+            st.transaction_id,
+            da.account_sk,
+            dd.date_sk,
+            LOWER(LTRIM(RTRIM(st.merchant_name))) AS merchant_name,
+            st.amount,
+            ISNULL(st.iso_currency_code, 'USD') AS currency_code,
+            ISNULL(st.payment_channel, 'online') AS payment_channel,
+            dc.category_sk,
+            CAST(CASE WHEN st.pending = 1 THEN 1 ELSE 0 END AS BIT) AS pending_flag
+        FROM Silver.stg_transactions st
+        INNER JOIN Gold.dim_account da
+            ON st.account_id = da.account_id
+            AND da.current_flag = 1
+        INNER JOIN Gold.dim_date dd
+            ON CAST(st.date AS DATE) = dd.date
+        LEFT JOIN Gold.dim_category dc
+            ON ISNULL(st.personal_finance_category_primary, '') = ISNULL(dc.primary_category, '')
+            AND ISNULL(st.personal_finance_category_detailed, '') = ISNULL(dc.detailed_category, '')
+        WHERE st.load_batch_id = @load_batch_id
+    ) AS src
+        ON ft.transaction_id = src.transaction_id
+    -- Only rows whose content changed are rewritten (EXCEPT compares NULLs as equal)
+    WHEN MATCHED AND EXISTS (
+        SELECT src.account_sk, src.date_sk, src.merchant_name, src.amount, src.currency_code, src.payment_channel, src.category_sk, src.pending_flag
+        EXCEPT
+        SELECT ft.account_sk, ft.date_sk, ft.merchant_name, ft.amount, ft.currency_code, ft.payment_channel, ft.category_sk, ft.pending_flag
+    ) THEN
+        UPDATE SET
+            account_sk = src.account_sk,
+            date_sk = src.date_sk,
+            merchant_name = src.merchant_name,
+            amount = src.amount,
+            currency_code = src.currency_code,
+            payment_channel = src.payment_channel,
+            category_sk = src.category_sk,
+            pending_flag = src.pending_flag
+    WHEN NOT MATCHED BY TARGET THEN
+        INSERT (transaction_id, account_sk, date_sk, merchant_name, amount, currency_code, payment_channel, category_sk, pending_flag, created_at)
+        VALUES (src.transaction_id, src.account_sk, src.date_sk, src.merchant_name, src.amount, src.currency_code,
+                src.payment_channel, src.category_sk, src.pending_flag, GETDATE())
+    OUTPUT
+        $action, inserted.transaction_id,
+        deleted.account_sk, deleted.date_sk, deleted.merchant_name, deleted.amount, deleted.category_sk, deleted.pending_flag,
+        inserted.account_sk, inserted.date_sk, inserted.merchant_name, inserted.amount, inserted.category_sk, inserted.pending_flag
+    INTO @changes;
+
+    -- Transactions in Plaid's removed list
+    DELETE ft
+    OUTPUT
+        'DELETE', deleted.transaction_id,
+        deleted.account_sk, deleted.date_sk, deleted.merchant_name, deleted.amount, deleted.category_sk, deleted.pending_flag,
+        NULL, NULL, NULL, NULL, NULL, NULL
+    INTO @changes
+    FROM Gold.fact_transactions ft
+    INNER JOIN Silver.stg_removed_transactions sr
+        ON sr.transaction_id = ft.transaction_id
+    WHERE sr.load_batch_id = @load_batch_id;
+
+    INSERT INTO Gold.fact_transaction_changes (
+        load_batch_id, transaction_id, account_sk, date_sk, merchant_name, amount, category_sk, pending_flag, sign
+    )
+    SELECT @load_batch_id, transaction_id, old_account_sk, old_date_sk, old_merchant_name, old_amount, old_category_sk, old_pending_flag, -1
+    FROM @changes
+    WHERE action IN ('UPDATE', 'DELETE')
+    UNION ALL
+    SELECT @load_batch_id, transaction_id, new_account_sk, new_date_sk, new_merchant_name, new_amount, new_category_sk, new_pending_flag, 1
+    FROM @changes
+    WHERE action IN ('INSERT', 'UPDATE');
+
+    COMMIT TRANSACTION;
+
+    -- Number of facts inserted, updated or deleted, read by load.py for the run metadata
+    SELECT COUNT(*) AS rows_affected FROM @changes;
 END;
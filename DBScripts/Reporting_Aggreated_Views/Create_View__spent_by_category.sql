@@ -1,12 +1,10 @@
-CREATE VIEW rpt_spend_by_category AS
+--Reads the incrementally maintained aggregate (see ddl_reporting_aggregates.sql) instead of scanning the fact table
+CREATE OR ALTER VIEW rpt_spend_by_category AS
 SELECT 
-    dc.primary_category,
-    dc.detailed_category,
-    SUM(ft.amount) AS total_spent,
-    COUNT(*) AS transaction_count
-FROM Gold.fact_transactions ft
-JOIN Gold.dim_category dc ON ft.category_sk = dc.category_sk
-WHERE ft.pending_flag = 0
-GROUP BY dc.primary_category, dc.detailed_category;
+    primary_category,
+    detailed_category,
+    total_spent,
+    transaction_count
+FROM Gold.agg_spend_by_category;
 
 --Select * FROM rpt_spend_by_category
\ No newline at end of file
@@ -1,10 +1,9 @@
-CREATE VIEW rpt_top_merchants AS
+--Reads the incrementally maintained aggregate (see ddl_reporting_aggregates.sql) instead of scanning the fact table
+CREATE OR ALTER VIEW rpt_top_merchants AS
 SELECT 
     merchant_name,
-    SUM(amount) AS total_spent,
-    COUNT(*) AS transaction_count
-FROM Gold.fact_transactions
-WHERE pending_flag = 0
-GROUP BY merchant_name;
+    total_spent,
+    transaction_count
+FROM Gold.agg_spend_by_merchant;
 
 --SELECT * FROM rpt_top_merchants
\ No newline at end of file
@@ -1,12 +1,10 @@
-CREATE VIEW rpt_monthly_trend AS
+--Reads the incrementally maintained aggregate (see ddl_reporting_aggregates.sql) instead of scanning the fact table
+CREATE OR ALTER VIEW rpt_monthly_trend AS
 SELECT 
-    dd.year,
-    dd.month,
-    dd.month_name,
-    SUM(ft.amount) AS monthly_spend
-FROM Gold.fact_transactions ft
-JOIN Gold.dim_date dd ON ft.date_sk = dd.date_sk
-WHERE ft.pending_flag = 0
-GROUP BY dd.year, dd.month, dd.month_name;
+    year,
+    month,
+    month_name,
+    total_spent AS monthly_spend
+FROM Gold.agg_monthly_spend;
 
 --SELECT * FROM rpt_monthly_trend
\ No newline at end of file
@@ -1,14 +1,11 @@
-CREATE VIEW rpt_monthly_spend_per_account AS
+--Reads the incrementally maintained aggregate (see ddl_reporting_aggregates.sql) instead of scanning the fact table
+CREATE OR ALTER VIEW rpt_monthly_spend_per_account AS
 SELECT 
-    da.account_id,
-    dd.year,
-    dd.month,
-    dd.month_name,
-    SUM(ft.amount) AS total_spent
-FROM Gold.fact_transactions ft
-JOIN Gold.dim_date dd ON ft.date_sk = dd.date_sk
-JOIN Gold.dim_account da ON ft.account_sk = da.account_sk
-WHERE ft.pending_flag = 0
-GROUP BY da.account_id, dd.year, dd.month, dd.month_name;
+    account_id,
+    year,
+    month,
+    month_name,
+    total_spent
+FROM Gold.agg_monthly_spend_per_account;
 
 --SELECT * FROM rpt_monthly_spend_per_account
\ No newline at end of file
@@ -0,0 +1,81 @@
+/*
+===============================================================================
+DDL Script: Create Reporting Aggregate Tables
+===============================================================================
+Script Purpose:
+    Pre-aggregated spend tables behind the reporting views and scripts/reporting.py.
+	  The fact loaders log every fact row they write in Gold.fact_transaction_changes,
+	  in the same transaction as the fact table. After every gold run
+	  reporting.refresh_aggregates adds the logged rows to the totals one load batch
+	  at a time, records the batch in Gold.agg_applied_batches and deletes its log
+	  rows, nothing re-scans Gold.fact_transactions.
+	  To build them from an already loaded fact table (or rebuild them), run
+	  python scripts/reporting.py rebuild
+	  Table Name:
+		1. Gold.agg_monthly_spend
+		2. Gold.agg_monthly_spend_per_account
+		3. Gold.agg_spend_by_category
+		4. Gold.agg_spend_by_merchant
+		5. Gold.fact_transaction_changes
+		6. Gold.agg_applied_batches
+===============================================================================
+*/
+
+CREATE TABLE Gold.agg_monthly_spend (
+	year					INT,
+	month					INT,
+	month_name				VARCHAR(15),
+	total_spent				DECIMAL(18,2),
+	transaction_count		INT,
+	PRIMARY KEY (year, month)
+);
+
+CREATE TABLE Gold.agg_monthly_spend_per_account (
+	account_id				VARCHAR(100),
+	year					INT,
+	month					INT,
+	month_name				VARCHAR(15),
+	total_spent				DECIMAL(18,2),
+	transaction_count		INT,
+	PRIMARY KEY (account_id, year, month)
+);
+
+CREATE TABLE Gold.agg_spend_by_category (
+	primary_category		VARCHAR(100),
+	detailed_category		VARCHAR(150),
+	total_spent				DECIMAL(18,2),
+	transaction_count		INT,
+	UNIQUE(primary_category, detailed_category)
+);
+
+CREATE TABLE Gold.agg_spend_by_merchant (
+	merchant_name			VARCHAR(255),
+	total_spent				DECIMAL(18,2),
+	transaction_count		INT,
+	UNIQUE(merchant_name)
+);
+
+--Fact rows written by a load batch and not yet added to the aggregates, sign 1 counts the row, -1 takes it back out
+CREATE TABLE Gold.fact_transaction_changes (
+	change_id				BIGINT IDENTITY(1,1) PRIMARY KEY,
+	load_batch_id			VARCHAR(40) NOT NULL,
+	transaction_id			VARCHAR(100),
+	account_sk				INT,
+	date_sk					INT,
+	merchant_name			VARCHAR(255),
+	amount					DECIMAL(18,2),
+	category_sk				INT,
+	pending_flag			BIT,
+	sign					SMALLINT NOT NULL
+);
+
+CREATE INDEX ix_fact_transaction_changes_batch ON Gold.fact_transaction_changes (load_batch_id);
+
+--One row per load batch added to the aggregates (reporting cache version)
+CREATE TABLE Gold.agg_applied_batches (
+	load_batch_id			VARCHAR(40) PRIMARY KEY,
+	run_id					VARCHAR(50),
+	change_rows				INT,
+	applied_at				DATETIME DEFAULT getdate()
+);
+GO
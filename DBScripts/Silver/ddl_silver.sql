@@ -9,6 +9,10 @@ Script Purpose:
 	  Table Name:
 		1. Silver.stg_accounts
 		2. Silver.stg_transactions
+		3. Silver.load_batches
+		4. Silver.stg_removed_transactions
+	  Every staged row carries the load_batch_id of the silver run that staged it,
+	  the gold procedures only read one batch and the batch is purged once gold succeeded
 ===============================================================================
 */
 
@@ -17,7 +21,8 @@ IF OBJECT_ID('Silver.stg_accounts', 'U') IS NOT NULL
 GO
 
 CREATE TABLE Silver.stg_accounts (
-    account_id							VARCHAR(100) PRIMARY KEY,
+    load_batch_id						VARCHAR(40) NOT NULL,
+    account_id							VARCHAR(100) NOT NULL,
 	mask								VARCHAR(10),
     name								NVARCHAR(255),
     official_name						NVARCHAR(255),
@@ -28,7 +33,9 @@ CREATE TABLE Silver.stg_accounts (
     balances_current					DECIMAL(18, 2),
     balances_limit						DECIMAL(18, 2),
     balances_iso_currency_code			VARCHAR(10),
-    balances_unofficial_currency_code	VARCHAR(10)
+    balances_unofficial_currency_code	VARCHAR(10),
+    row_hash							CHAR(32),		--MD5 of the SCD2 tracked attributes, computed in transform.py
+    PRIMARY KEY (load_batch_id, account_id)
 );
 GO
 
@@ -37,7 +44,8 @@ IF OBJECT_ID('Silver.stg_transactions', 'U') IS NOT NULL
 GO
 
 CREATE TABLE Silver.stg_transactions (
-    transaction_id VARCHAR(100) PRIMARY KEY,
+    load_batch_id VARCHAR(40) NOT NULL,
+    transaction_id VARCHAR(100) NOT NULL,
     account_id VARCHAR(100),
     name NVARCHAR(255),
     amount DECIMAL(18, 2),
@@ -57,6 +65,34 @@ CREATE TABLE Silver.stg_transactions (
     payment_meta_reference_number VARCHAR(100),
     payment_meta_payee NVARCHAR(255),
     personal_finance_category_primary VARCHAR(100),
-    personal_finance_category_detailed VARCHAR(100)
+    personal_finance_category_detailed VARCHAR(100),
+    row_hash CHAR(32),		--MD5 of the transaction, recorded in the local transaction index once gold loaded it
+    PRIMARY KEY (load_batch_id, transaction_id)
+);
+GO
+
+IF OBJECT_ID('Silver.stg_removed_transactions', 'U') IS NOT NULL
+    DROP TABLE Silver.stg_removed_transactions;
+GO
+
+-- Ids in Plaid's removed list, gold deletes them from the fact table
+CREATE TABLE Silver.stg_removed_transactions (
+    load_batch_id VARCHAR(40) NOT NULL,
+    transaction_id VARCHAR(100) NOT NULL,
+    PRIMARY KEY (load_batch_id, transaction_id)
+);
+GO
+
+IF OBJECT_ID('Silver.load_batches', 'U') IS NOT NULL
+    DROP TABLE Silver.load_batches;
+GO
+
+-- One row per staged batch, gold only picks up batches whose staging finished
+CREATE TABLE Silver.load_batches (
+    load_batch_id       VARCHAR(40) PRIMARY KEY,
+    source_file         VARCHAR(255),
+    status              VARCHAR(20),        -- Staged -> Processed
+    staged_at           DATETIME DEFAULT GETDATE(),
+    processed_at        DATETIME
 );
 GO
\ No newline at end of file
@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "scripts"))
+sys.path.insert(0, BENCH_DIR)
+
+from workload import generate_accounts, generate_transaction
+from bronze_io import BronzeJSONEncoder
+
+# === Local Plaid API Stand-In ===
+# Serves the endpoints extract.py calls, with generated data, so extraction can be measured and tuned offline:
+#   /sandbox/public_token/create, /item/public_token/exchange, /item/get, /transactions/get, /transactions/sync
+# Point the extractor at it with PLAID_HOST=http://127.0.0.1:8765 (any client id / secret is accepted).
+#   python benchmarks/plaid_standin.py --transactions 100000 --latency-ms 80 --not-ready-calls 2 --rate-limit-rate 0.05
+
+START_DATE = date(2024, 1, 1)
+
+class StandinState:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.calls = {}           # access_token -> transactions calls so far, drives PRODUCT_NOT_READY
+        self.request_count = 0
+
+    def next_request_id(self):
+        with self.lock:
+            self.request_count += 1
+            return f"standin-{self.request_count:08d}"
+
+    def count_transactions_call(self, access_token):
+        with self.lock:
+            self.calls[access_token] = self.calls.get(access_token, 0) + 1
+            return self.calls[access_token]
+
+# Every item is derived from its institution id, so the same institution always gets the same item,
+# accounts and transactions, and saved sync cursors stay valid across runs
+def item_seed(args, item_id):
+    return zlib.crc32(f"{args.seed}-{item_id}".encode())
+
+def item_accounts(args, item_id):
+    return generate_accounts(random.Random(f"{args.seed}-{item_id}-accounts"), args.accounts, owner=item_seed(args, item_id))
+
+# Transactions are generated by position, any page can be served without keeping the item in memory
+def item_transactions(args, item_id, offset, count):
+    accounts = item_accounts(args, item_id)
+    seed = item_seed(args, item_id)
+    end = min(offset + count, args.transactions)
+    return [
+        generate_transaction(random.Random(f"{args.seed}-{item_id}-{i}"), i, accounts, START_DATE, seed)
+        for i in range(offset, end)
+    ]
+
+def item_from_token(token):
+    # public-sandbox-<institution>, access-sandbox-<institution>
+    return f"item_{token.split('-sandbox-', 1)[-1]}"
+
+class PlaidError(Exception):
+    def __init__(self, status, error_type, error_code, message):
+        super().__init__(message)
+        self.status = status
+        self.body = {
+            "error_type": error_type,
+            "error_code": error_code,
+            "error_message": message,
+            "display_message": None
+        }
+
+# === Endpoints ===
+def sandbox_public_token_create(state, body):
+    return {"public_token": f"public-sandbox-{body.get('institution_id', 'ins_109508')}"}
+
+def item_public_token_exchange(state, body):
+    public_token = body.get("public_token", "")
+    if not public_token.startswith("public-sandbox-"):
+        raise PlaidError(400, "INVALID_INPUT", "INVALID_PUBLIC_TOKEN", "provided public token is in an invalid format")
+    institution = public_token[len("public-sandbox-"):]
+    return {"access_token": f"access-sandbox-{institution}", "item_id": f"item_{institution}"}
+
+def item_payload(item_id):
+    return {
+        "item_id": item_id,
+        "institution_id": item_id[len("item_"):],
+        "webhook": None,
+        "error": None,
+        "available_products": ["balance"],
+        "billed_products": ["transactions"],
+        "consent_expiration_time": None,
+        "update_type": "background"
+    }
+
+def item_get(state, body):
+    return {"item": item_payload(item_from_token(body.get("access_token", "")))}
+
+def check_transactions_ready(state, access_token):
+    # The first calls after linking fail like a freshly linked sandbox item does
+    return state.count_transactions_call(access_token) > state.args.not_ready_calls
+
+def transactions_get(state, body):
+    args = state.args
+    access_token = body.get("access_token", "")
+    if not check_transactions_ready(state, access_token):
+        raise PlaidError(400, "ITEM_ERROR", "PRODUCT_NOT_READY", "the requested product is not yet ready")
+
+    options = body.get("options") or {}
+    offset = int(options.get("offset", 0))
+    count = min(int(options.get("count", 100)), args.max_page_size)
+    item_id = item_from_token(access_token)
+    return {
+        "accounts": item_accounts(args, item_id),
+        "transactions": item_transactions(args, item_id, offset, count),
+        "total_transactions": args.transactions,
+        "item": item_payload(item_id)
+    }
+
+def transactions_sync(state, body):
+    args = state.args
+    access_token = body.get("access_token", "")
+    item_id = item_from_token(access_token)
+    accounts = item_accounts(args, item_id)
+    cursor = body.get("cursor") or ""
+
+    if not cursor and not check_transactions_ready(state, access_token):
+        # /transactions/sync does not fail while the history is pulled, it reports NOT_READY with no data
+        return {
+            "transactions_update_status": "NOT_READY", "accounts": accounts,
+            "added": [], "modified": [], "removed": [], "next_cursor": "", "has_more": False
+        }
+
+    # The cursor is the position in the item's history, opaque to the client like Plaid's
+    offset = int(cursor.rsplit(":", 1)[-1]) if cursor else 0
+    count = min(int(body.get("count", 100)), args.max_page_size)
+    added = item_transactions(args, item_id, offset, count)
+    next_offset = offset + len(added)
+    return {
+        "transactions_update_status": "HISTORICAL_UPDATE_COMPLETE",
+        "accounts": accounts,
+        "added": added,
+        "modified": [],
+        "removed": [],
+        "next_cursor": f"standin:{item_id}:{next_offset}",
+        "has_more": next_offset < args.transactions
+    }
+
+ENDPOINTS = {
+    "/sandbox/public_token/create": sandbox_public_token_create,
+    "/item/public_token/exchange": item_public_token_exchange,
+    "/item/get": item_get,
+    "/transactions/get": transactions_get,
+    "/transactions/sync": transactions_sync,
+}
+
+# === HTTP Handler ===
+class PlaidStandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"     # keep-alive, like the pooled connections of the real client
+    state = None
+
+    def do_POST(self):
+        args = self.state.args
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        # Latency is applied before anything else so error responses cost time too, as they do against Plaid
+        if args.latency_ms or args.jitter_ms:
+            time.sleep(max(0.0, args.latency_ms + random.uniform(-args.jitter_ms, args.jitter_ms)) / 1000)
+
+        status, payload = 200, None
+        try:
+            endpoint = ENDPOINTS.get(self.path)
+            if endpoint is None:
+                raise PlaidError(404, "API_ERROR", "NOT_FOUND", f"unknown endpoint {self.path}")
+            if self.path.startswith("/transactions/") and random.random() < args.rate_limit_rate:
+                raise PlaidError(429, "RATE_LIMIT_EXCEEDED", "TRANSACTIONS_LIMIT", "rate limit exceeded for this item")
+            if random.random() < args.error_rate:
+                raise PlaidError(500, "API_ERROR", "INTERNAL_SERVER_ERROR", "an unexpected error occurred")
+            payload = endpoint(self.state, body)
+        except PlaidError as e:
+            status, payload = e.status, e.body
+
+        payload["request_id"] = self.state.next_request_id()
+        data = json.dumps(payload, cls=BronzeJSONEncoder).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.state.args.verbose:
+            super().log_message(format, *args)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Plaid endpoints used by extract.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--transactions", type=int, default=10_000, help="history size of every item")
+    parser.add_argument("--accounts", type=int, default=12, help="accounts per item")
+    parser.add_argument("--max-page-size", type=int, default=500, help="upper bound for the count a client asks for")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="latency varies by up to this much either way")
+    parser.add_argument("--not-ready-calls", type=int, default=0, help="transactions calls per item answered with PRODUCT_NOT_READY / NOT_READY")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of transactions calls answered with RATE_LIMIT_EXCEEDED (429)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with INTERNAL_SERVER_ERROR (500)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser
+
+def make_server(args):
+    handler = type("Handler", (PlaidStandinHandler,), {"state": StandinState(args)})
+    return ThreadingHTTPServer((args.host, args.port), handler)
+
+# === Main ===
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    random.seed(args.seed)
+    server = make_server(args)
+    print(f"Plaid stand-in listening on http://{args.host}:{server.server_port} "
+          f"({args.transactions:,} transactions per item, {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms latency)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import logging
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from time import perf_counter
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "scripts"))
+sys.path.insert(0, BENCH_DIR)
+
+from workload import SIZES, write_bronze_workload
+from bronze_io import iter_bronze_records
+from silver_schema import TRANSACTION_FIELDS
+from run_log import peak_rss_mb, set_run_context
+from transform import (
+    flatten_records, get_chunk_rows, process_records_to_silver, save_silver_files, iter_silver_chunks, remove_spill,
+    insert_into_sql
+)
+
+# === End-to-End Benchmark Suite ===
+# Times every pipeline stage on a synthetic workload and compares rows/sec with the stored baseline.
+#   python benchmarks/run_benchmarks.py                       -> 10k and 100k, compared with baseline.json
+#   python benchmarks/run_benchmarks.py --sizes 1m,10m        -> the large workloads (minutes, GBs of disk)
+#   python benchmarks/run_benchmarks.py --update-baseline     -> store this run as the new baseline
+# SQL Server is replaced by SQLite so the insert path (bulk_insert + load checkpoints) runs anywhere.
+
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+STAGES = ["bronze_write", "bronze_read", "flatten", "silver_transform", "csv_write", "sql_insert"]
+
+def stage_result(seconds, rows):
+    return {
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds) if seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+# SQLite stand-in for the Silver schema, the table takes whatever columns the frame has
+def get_sqlite_connection(db_path, columns):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"ATTACH DATABASE '{db_path}.silver' AS Silver")
+    conn.execute("DROP TABLE IF EXISTS Silver.stg_transactions")
+    conn.execute(f"CREATE TABLE Silver.stg_transactions ({', '.join(columns)})")
+    conn.commit()
+    return conn
+
+# === One Workload Size ===
+# Runs in its own process so peak RSS belongs to this size only
+def run_size(size, workdir, seed, memory_limit_mb, batch_size):
+    count = SIZES[size]
+    size_dir = os.path.join(workdir, size)
+    os.makedirs(size_dir, exist_ok=True)
+    # transform writes quarantine files and load checkpoints relative to the working directory
+    os.chdir(size_dir)
+    logging.basicConfig(level=logging.WARNING)
+    # Spans of the pipeline functions land in the run log of the work directory
+    set_run_context(f"bench_{size}", "benchmark")
+
+    results = {}
+    bronze_path = os.path.join(size_dir, f"transactions_bench_{size}.ndjson.gz")
+    results["bronze_write"] = stage_result(write_bronze_workload(bronze_path, count, seed), count)
+
+    start = perf_counter()
+    for _ in iter_bronze_records(bronze_path):
+        pass
+    results["bronze_read"] = stage_result(perf_counter() - start, count)
+
+    # Flattening only, in the chunk size the silver transform uses, reading the file is left out
+    chunk_rows = get_chunk_rows(memory_limit_mb)
+    flatten_seconds, chunk = 0.0, []
+    for record_type, record in iter_bronze_records(bronze_path):
+        if record_type == "transaction":
+            chunk.append(record)
+            if len(chunk) >= chunk_rows:
+                start = perf_counter()
+                flatten_records(chunk, TRANSACTION_FIELDS)
+                flatten_seconds += perf_counter() - start
+                chunk = []
+    if chunk:
+        start = perf_counter()
+        flatten_records(chunk, TRANSACTION_FIELDS)
+        flatten_seconds += perf_counter() - start
+    chunk = None
+    results["flatten"] = stage_result(flatten_seconds, count)
+
+    # Read + flatten + cleaning rules + dtypes + spill files, what process_json_to_silver does without the CSV writes
+    start = perf_counter()
+    silver = process_records_to_silver(iter_bronze_records(bronze_path), f"bench_{size}", memory_limit_mb, silver_formats=())
+    results["silver_transform"] = stage_result(perf_counter() - start, count)
+    clean_rows = silver["transactions"]
+
+    start = perf_counter()
+    save_silver_files(silver, ("csv",))
+    results["csv_write"] = stage_result(perf_counter() - start, clean_rows)
+
+    # Chunk by chunk from the spill files, like stage_silver_file
+    conn = None
+    try:
+        start = perf_counter()
+        for tx_df in iter_silver_chunks(silver):
+            conn = conn or get_sqlite_connection(os.path.join(size_dir, "bench.db"), tx_df.columns)
+            insert_into_sql(tx_df, "Silver.stg_transactions", conn, batch_size)
+        results["sql_insert"] = stage_result(perf_counter() - start, clean_rows)
+    finally:
+        if conn is not None:
+            conn.close()
+        remove_spill(silver)
+
+    return {"rows": count, "clean_rows": clean_rows, "peak_rss_mb": peak_rss_mb(), "stages": results}
+
+# === Baseline Comparison ===
+# A stage regresses when its rows/sec falls more than tolerance below the baseline
+def compare_with_baseline(results, baseline, tolerance):
+    regressions = []
+    for size, result in results.items():
+        base_size = baseline.get("sizes", {}).get(size)
+        if not base_size:
+            print(f"{size}: no baseline recorded")
+            continue
+        for stage in STAGES:
+            current = result["stages"][stage]["rows_per_sec"]
+            base = base_size["stages"].get(stage, {}).get("rows_per_sec")
+            if not current or not base:
+                continue
+            change = (current - base) / base
+            flag = "REGRESSION" if change < -tolerance else "ok"
+            print(f"{size:>5} {stage:<17} {base:>12,} -> {current:>12,} rows/s  {change:+7.1%}  {flag}")
+            if flag == "REGRESSION":
+                regressions.append(f"{size}/{stage}")
+    return regressions
+
+def print_results(results):
+    print(f"{'size':>5} {'stage':<17} {'seconds':>9} {'rows/s':>12} {'peak RSS MB':>12}")
+    for size, result in results.items():
+        for stage in STAGES:
+            r = result["stages"][stage]
+            rps = f"{r['rows_per_sec']:,}" if r["rows_per_sec"] else "-"
+            print(f"{size:>5} {stage:<17} {r['seconds']:>9.3f} {rps:>12} {r['peak_rss_mb'] or '-':>12}")
+
+# === Main ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the bronze -> silver -> SQL pipeline on synthetic Plaid data")
+    parser.add_argument("--sizes", default="10k,100k", help=f"comma separated, any of {', '.join(SIZES)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--memory-limit-mb", type=int, default=512, help="same meaning as SILVER_MEMORY_LIMIT_MB")
+    parser.add_argument("--batch-size", type=int, default=5000, help="same meaning as SQL_BATCH_SIZE")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed rows/sec drop against the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--workdir", help="keep the generated files here instead of a temp directory")
+    args = parser.parse_args()
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="plaid_bench_")
+    results = {}
+    try:
+        # A fresh process per size, otherwise the peak RSS of a large size hides the smaller ones
+        ctx = multiprocessing.get_context("spawn")
+        for size in sizes:
+            print(f"Running {size} ({SIZES[size]:,} transactions)...")
+            with ctx.Pool(1) as pool:
+                results[size] = pool.apply(run_size, (size, workdir, args.seed, args.memory_limit_mb, args.batch_size))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+    run = {
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "memory_limit_mb": args.memory_limit_mb,
+        "batch_size": args.batch_size,
+        "sizes": results
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"), "w") as f:
+        json.dump(run, f, indent=2)
+
+    if args.update_baseline:
+        # Sizes that were not part of this run keep their old baseline
+        baseline = {}
+        if os.path.exists(BASELINE_FILE):
+            with open(BASELINE_FILE) as f:
+                baseline = json.load(f)
+        run["sizes"] = {**baseline.get("sizes", {}), **results}
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline updated: {BASELINE_FILE}")
+    elif os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Performance regression in: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        print("No baseline yet, run with --update-baseline to record one")
@@ -0,0 +1,181 @@
+import os
+import sys
+import zlib
+import random
+from time import perf_counter
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from bronze_io import BronzeWriter
+
+# === Synthetic Plaid Workload ===
+# Deterministic for a given seed, so every benchmark run works on exactly the same records.
+# Records have the shape of /transactions/sync responses (nested counterparties, location,
+# payment_meta and personal_finance_category), dates are date objects like the Plaid client returns.
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+MERCHANTS = [
+    ("Starbucks", "FOOD_AND_DRINK", "FOOD_AND_DRINK_COFFEE", ["Food and Drink", "Restaurants", "Coffee Shop"]),
+    ("McDonald's", "FOOD_AND_DRINK", "FOOD_AND_DRINK_FAST_FOOD", ["Food and Drink", "Restaurants", "Fast Food"]),
+    ("Uber", "TRANSPORTATION", "TRANSPORTATION_TAXIS_AND_RIDE_SHARES", ["Travel", "Taxi"]),
+    ("United Airlines", "TRAVEL", "TRAVEL_FLIGHTS", ["Travel", "Airlines and Aviation Services"]),
+    ("Amazon", "GENERAL_MERCHANDISE", "GENERAL_MERCHANDISE_ONLINE_MARKETPLACES", ["Shops", "Digital Purchase"]),
+    ("Walmart", "GENERAL_MERCHANDISE", "GENERAL_MERCHANDISE_SUPERSTORES", ["Shops", "Supermarkets and Groceries"]),
+    ("Whole Foods", "FOOD_AND_DRINK", "FOOD_AND_DRINK_GROCERIES", ["Shops", "Supermarkets and Groceries"]),
+    ("Shell", "TRANSPORTATION", "TRANSPORTATION_GAS", ["Travel", "Gas Stations"]),
+    ("Netflix", "ENTERTAINMENT", "ENTERTAINMENT_TV_AND_MOVIES", ["Service", "Subscription"]),
+    ("Spotify", "ENTERTAINMENT", "ENTERTAINMENT_MUSIC_AND_AUDIO", ["Service", "Subscription"]),
+    ("Touchstone Climbing", "PERSONAL_CARE", "PERSONAL_CARE_GYMS_AND_FITNESS_CENTERS", ["Recreation", "Gyms and Fitness Centers"]),
+    ("SparkFun", "GENERAL_MERCHANDISE", "GENERAL_MERCHANDISE_ELECTRONICS", ["Shops", "Computers and Electronics"]),
+    ("KFC", "FOOD_AND_DRINK", "FOOD_AND_DRINK_FAST_FOOD", ["Food and Drink", "Restaurants", "Fast Food"]),
+    ("Madison Bicycle Shop", "GENERAL_MERCHANDISE", "GENERAL_MERCHANDISE_SPORTING_GOODS", ["Shops", "Sporting Goods"]),
+]
+
+# Transfers and payments carry no merchant, like INTRST PYMNT or CREDIT CARD 3333 PAYMENT in the sandbox data
+NON_MERCHANT = [
+    ("CREDIT CARD 3333 PAYMENT *//", "LOAN_PAYMENTS", "LOAN_PAYMENTS_CREDIT_CARD_PAYMENT", ["Payment", "Credit Card"]),
+    ("INTRST PYMNT", "INCOME", "INCOME_INTEREST_EARNED", ["Transfer", "Credit"]),
+    ("AUTOMATIC PAYMENT - THANK", "LOAN_PAYMENTS", "LOAN_PAYMENTS_OTHER_PAYMENT", ["Payment"]),
+    ("ACH Electronic CreditGUSTO PAY 123456", "INCOME", "INCOME_WAGES", ["Transfer", "Payroll"]),
+]
+
+CITIES = [
+    ("San Francisco", "CA", "US"), ("New York", "NY", "US"), ("Chicago", "IL", "US"),
+    ("Austin", "TX", "US"), ("Seattle", "WA", "US"), (None, None, None),
+]
+
+CHANNELS = ["in store", "online", "other"]
+
+ACCOUNT_TYPES = [
+    ("Plaid Checking", "Plaid Gold Standard 0% Interest Checking", "depository", "checking"),
+    ("Plaid Saving", "Plaid Silver Standard 0.1% Interest Saving", "depository", "savings"),
+    ("Plaid Credit Card", "Plaid Diamond 12.5% APR Interest Credit Card", "credit", "credit card"),
+    ("Plaid Mortgage", None, "loan", "mortgage"),
+]
+
+# owner keeps the account ids of different items apart (at most 10 digits), 0 gives the single item ids
+def generate_accounts(rng, n_accounts=12, owner=0):
+    accounts = []
+    for i in range(n_accounts):
+        name, official_name, acc_type, subtype = ACCOUNT_TYPES[i % len(ACCOUNT_TYPES)]
+        current = round(rng.uniform(0, 50_000), 2)
+        accounts.append({
+            "account_id": f"acc{owner:010d}{i:024d}",
+            "balances": {
+                "available": current if acc_type == "depository" else None,
+                "current": current,
+                "limit": 2000.0 if acc_type == "credit" else None,
+                "iso_currency_code": "USD",
+                "unofficial_currency_code": None
+            },
+            "mask": f"{i:04d}",
+            "name": name,
+            "official_name": official_name,
+            "type": acc_type,
+            "subtype": subtype,
+            "holder_category": "personal"
+        })
+    return accounts
+
+def generate_transaction(rng, index, accounts, start_date, seed):
+    has_merchant = rng.random() < 0.8
+    name, pfc_primary, pfc_detailed, category = rng.choice(MERCHANTS if has_merchant else NON_MERCHANT)
+    city, region, country = rng.choice(CITIES)
+    tx_date = start_date + timedelta(days=rng.randrange(730))
+    amount = round(rng.lognormvariate(3, 1.2), 2)
+    # About 1% refunds, they end up in the silver quarantine like real negative amounts would
+    if rng.random() < 0.01:
+        amount = -amount
+
+    return {
+        "account_id": rng.choice(accounts)["account_id"],
+        "account_owner": None,
+        "amount": amount,
+        "authorized_date": tx_date - timedelta(days=rng.randrange(3)),
+        "authorized_datetime": None,
+        "category": category,
+        "category_id": f"{13000000 + rng.randrange(100):08d}",
+        "check_number": None,
+        "counterparties": [{
+            "name": name,
+            "type": "merchant",
+            "entity_id": f"ent{zlib.crc32(name.encode()):08x}",
+            "confidence_level": rng.choice(["VERY_HIGH", "HIGH", "MEDIUM"]),
+            "logo_url": None,
+            "website": None
+        }] if has_merchant else [],
+        "date": tx_date,
+        "datetime": None,
+        "iso_currency_code": "USD",
+        "location": {
+            "address": None,
+            "city": city,
+            "region": region,
+            "postal_code": None,
+            "country": country,
+            "lat": None,
+            "lon": None,
+            "store_number": None
+        },
+        "logo_url": None,
+        "merchant_entity_id": None,
+        "merchant_name": name if has_merchant else None,
+        "name": name,
+        "payment_channel": rng.choice(CHANNELS),
+        "payment_meta": {
+            "reference_number": None if has_merchant else f"{rng.randrange(10**8):08d}",
+            "ppd_id": None,
+            "payee": None,
+            "by_order_of": None,
+            "payer": None,
+            "payment_method": None,
+            "payment_processor": None,
+            "reason": None
+        },
+        "pending": rng.random() < 0.02,
+        "pending_transaction_id": None,
+        "personal_finance_category": {
+            "confidence_level": rng.choice(["VERY_HIGH", "HIGH", "LOW"]),
+            "detailed": pfc_detailed,
+            "primary": pfc_primary
+        },
+        "transaction_code": None,
+        "transaction_id": f"tx{seed:05d}{index:030d}",
+        "transaction_type": "place" if has_merchant else "special",
+        "unofficial_currency_code": None,
+        "website": None
+    }
+
+# Yields pages the size of a /transactions/sync page, only one page is alive at a time
+def generate_pages(count, seed=42, page_size=500, n_accounts=12):
+    rng = random.Random(seed)
+    accounts = generate_accounts(rng, n_accounts)
+    start_date = date(2024, 1, 1)
+    for page_start in range(0, count, page_size):
+        page_end = min(page_start + page_size, count)
+        yield [generate_transaction(rng, i, accounts, start_date, seed) for i in range(page_start, page_end)], accounts
+
+# === Write Workload to Bronze ===
+# Same layout extract.py produces, returns the seconds spent inside the bronze writer
+# (JSON encoding with date serialization and compression), generation time is left out
+def write_bronze_workload(filepath, count, seed=42, page_size=500, n_accounts=12):
+    write_seconds = 0.0
+    accounts = []
+    with BronzeWriter(filepath) as writer:
+        for page, accounts in generate_pages(count, seed, page_size, n_accounts):
+            start = perf_counter()
+            writer.write_records("transaction", page)
+            write_seconds += perf_counter() - start
+        start = perf_counter()
+        writer.write_records("account", accounts)
+        writer.write_records("meta", [{"item_id": f"bench_{seed}", "next_cursor": None}])
+        write_seconds += perf_counter() - start
+    return write_seconds
+
+if __name__ == "__main__":
+    # python benchmarks/workload.py 100k data/bronze/transactions_bench_100k.ndjson.gz
+    size = sys.argv[1] if len(sys.argv) > 1 else "10k"
+    target = sys.argv[2] if len(sys.argv) > 2 else f"data/bronze/transactions_bench_{size}.ndjson.gz"
+    write_bronze_workload(target, SIZES[size])
+    print(f"Wrote {SIZES[size]} synthetic transactions to {target}")
@@ -0,0 +1,122 @@
+import os
+import json
+import gzip
+from datetime import datetime, date
+
+# zstd is optional, gzip from the standard library is always available
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Newest format first, legacy pretty printed .json files are still readable
+BRONZE_EXTENSIONS = (".ndjson.gz", ".ndjson.zst", ".json")
+
+# Record types carrying a full transaction, "modified" is a newer version of one delivered before
+TRANSACTION_RECORD_TYPES = ("transaction", "modified")
+
+# === JSON Encoder ===
+# Dates are serialized while writing instead of building a converted copy of the whole response tree
+class BronzeJSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, (date, datetime)):
+            return obj.isoformat()
+        return super().default(obj)
+
+def is_bronze_file(filename):
+    return filename.endswith(BRONZE_EXTENSIONS)
+
+def _open_compressed(filepath, mode):
+    if filepath.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("zstandard is required for .ndjson.zst bronze files, install it or use BRONZE_FORMAT=ndjson.gz")
+        if "w" in mode:
+            return zstandard.open(filepath, mode, cctx=zstandard.ZstdCompressor(level=3), encoding="utf-8")
+        return zstandard.open(filepath, mode, encoding="utf-8")
+    return gzip.open(filepath, mode, compresslevel=6, encoding="utf-8") if "w" in mode else gzip.open(filepath, mode, encoding="utf-8")
+
+# === Streaming Bronze Writer ===
+# One line per record: {"record_type": "transaction" | "modified" | "account" | "removed" | "meta", "data": {...}}
+# Pages are appended as they arrive, so memory holds one page at a time no matter how long the history is
+class BronzeWriter:
+    def __init__(self, filepath):
+        self.filepath = filepath
+        # Written under a temp name and renamed on close, the transform stage never sees a half written file
+        self.part_path = f"{filepath}.part"
+        self.counts = {}
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+        self._file = _open_compressed(self.part_path, "wt")
+        return self
+
+    def write_records(self, record_type, records):
+        encoder = BronzeJSONEncoder(separators=(",", ":"))
+        lines = [encoder.encode({"record_type": record_type, "data": record}) for record in records]
+        if lines:
+            self._file.write("\n".join(lines) + "\n")
+        self.counts[record_type] = self.counts.get(record_type, 0) + len(lines)
+
+    # (record_type, record) pairs as collected by RecordCollector
+    def write_pairs(self, pairs, lines_per_write=1000):
+        encoder = BronzeJSONEncoder(separators=(",", ":"))
+        lines = []
+        for record_type, record in pairs:
+            lines.append(encoder.encode({"record_type": record_type, "data": record}))
+            self.counts[record_type] = self.counts.get(record_type, 0) + 1
+            if len(lines) >= lines_per_write:
+                self._file.write("\n".join(lines) + "\n")
+                lines = []
+        if lines:
+            self._file.write("\n".join(lines) + "\n")
+
+    def reset(self):
+        # Throw away everything written so far, used when an extraction has to restart from scratch
+        self._file.close()
+        self._file = _open_compressed(self.part_path, "wt")
+        self.counts = {}
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is None:
+            os.replace(self.part_path, self.filepath)
+        elif os.path.exists(self.part_path):
+            os.remove(self.part_path)
+        return False
+
+# === In Memory Collector ===
+# Same interface as BronzeWriter but keeps the records, used by the in-process pipeline
+# which hands them straight to the silver stage and writes the bronze file in the background
+class RecordCollector:
+    def __init__(self):
+        self.records = []
+        self.counts = {}
+
+    def write_records(self, record_type, records):
+        self.records.extend((record_type, record) for record in records)
+        self.counts[record_type] = self.counts.get(record_type, 0) + len(records)
+
+    def reset(self):
+        self.records = []
+        self.counts = {}
+
+def transaction_count(counts):
+    return sum(counts.get(record_type, 0) for record_type in TRANSACTION_RECORD_TYPES)
+
+# === Streaming Bronze Reader ===
+# Yields (record_type, record) one at a time for both the streaming format and the legacy single JSON document
+def iter_bronze_records(filepath):
+    if filepath.endswith(".json"):
+        with open(filepath, "r") as f:
+            raw_data = json.load(f)
+        for record_type, key in (("account", "accounts"), ("transaction", "transactions"), ("removed", "removed")):
+            for record in raw_data.get(key, []):
+                yield record_type, record
+        return
+
+    with _open_compressed(filepath, "rt") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield row["record_type"], row["data"]
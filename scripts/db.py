@@ -0,0 +1,106 @@
+import os
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+import pyodbc
+import pandas as pd
+from dotenv import load_dotenv
+
+# === SQL Server Credentials ===
+# Shared by every stage, each adds its own settings on top
+def load_sql_credentials():
+    load_dotenv()
+    return {
+        "server": os.getenv("SQL_SERVER"),
+        "database": os.getenv("SQL_DATABASE"),
+        "username": os.getenv("SQL_USERNAME"),
+        "password": os.getenv("SQL_PASSWORD"),
+    }
+
+# === SQL Server Connection ===
+def build_connection_string(creds):
+    return (
+        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+        f"SERVER={creds['server']};"
+        f"DATABASE={creds['database']};"
+        f"UID={creds['username']};"
+        f"PWD={creds['password']}"
+    )
+
+def get_connection(creds):
+    return pyodbc.connect(build_connection_string(creds))
+
+# === Connection Pool ===
+# Hands out at most `size` connections at a time and keeps released ones open for the next caller,
+# so concurrent steps don't each pay for a fresh ODBC login
+class ConnectionPool:
+    def __init__(self, creds, size=4):
+        self.creds = creds
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = get_connection(self.creds)
+            try:
+                yield conn
+            except Exception:
+                # A failed step may leave an open transaction or a broken connection behind, never reuse it
+                conn.close()
+                raise
+            self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+# === Bulk Insert ===
+# Rows are sent in batches with fast_executemany (one round-trip per batch instead of per row)
+# and every batch is committed on its own so an interrupted load can resume after the last committed batch.
+# commit=False leaves the whole insert to the caller's transaction.
+def bulk_insert(conn, df, table_name, batch_size=5000, start_row=0, on_batch_committed=None, commit=True):
+    if df.empty or start_row >= len(df):
+        return 0
+
+    columns = ', '.join(df.columns)
+    placeholders = ', '.join(['?'] * len(df.columns))
+    sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+
+    # NaN / NaT / pd.NA become None for the whole frame at once instead of value by value
+    values_df = df.iloc[start_row:].astype(object)
+    # Plain datetime objects bind on every driver, pandas Timestamps only on some.
+    # Taken by position, newer pandas return a Series with a fresh index that would not align with a filtered frame.
+    for col in df.columns[df.dtypes.map(pd.api.types.is_datetime64_any_dtype)]:
+        values_df[col] = pd.Series(list(df[col].iloc[start_row:].dt.to_pydatetime()), index=values_df.index, dtype=object)
+    values_df = values_df.where(values_df.notna(), None)
+    rows = list(values_df.itertuples(index=False, name=None))
+
+    cursor = conn.cursor()
+    # Only pyodbc cursors know fast_executemany, other DB-API drivers just use plain executemany
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+
+    inserted = 0
+    for batch_start in range(0, len(rows), batch_size):
+        batch = rows[batch_start:batch_start + batch_size]
+        cursor.executemany(sql, batch)
+        inserted += len(batch)
+        if not commit:
+            continue
+        conn.commit()
+        if on_batch_committed:
+            on_batch_committed(start_row + inserted)
+        logging.info(f"Committed {start_row + inserted}/{len(df)} rows into {table_name}")
+    cursor.close()
+    return inserted
@@ -1,14 +1,14 @@
 #To do all the operating system related operations like reading writing the file or creating directory etc
 import os
-#To work with json file
-import json
 #Using python default logging module to create the log files
 import logging
-from datetime import datetime, timedelta,date
+from datetime import datetime, timedelta
 #To load the data from the env file
 from dotenv import load_dotenv
 import time
 import csv
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 #Plaid SDK integrated with python
 from plaid.api import plaid_api
@@ -18,29 +18,51 @@ from plaid.model.sandbox_public_token_create_request import SandboxPublicTokenCr
 from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
 from plaid.model.transactions_get_request import TransactionsGetRequest
 from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
+from plaid.model.transactions_sync_request import TransactionsSyncRequest
+from plaid.model.item_get_request import ItemGetRequest
 from plaid import ApiClient, Configuration
 from plaid.exceptions import ApiException
 
-#convert  date fucntion to convert the date in the response to string as JSON doesn't support datetime
-def convert_dates(obj):
-    if isinstance(obj, dict):
-        return {k: convert_dates(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_dates(item) for item in obj]
-    elif isinstance(obj, (date, datetime)):
-        return obj.isoformat()
-    else:
-        return obj
-    
+from rate_limiter import TokenBucket
+from retry import RetryPolicy, RetryingClient, ApiCallStats
+from bronze_io import BronzeWriter, RecordCollector, transaction_count
+from state_store import load_state, update_state
+from run_log import set_run_context, log_event, span, file_size
+
+# The audit trail of extract runs, one CSV row per run next to the run event in the run log
 def write_metadata_log(metadata, log_path='logs/audit/control_log.csv'):
     os.makedirs(os.path.dirname(log_path), exist_ok=True)
     file_exists = os.path.exists(log_path)
+    # The per endpoint stats are nested, the CSV keeps them as a JSON string
+    row = {**metadata, "api_stats": json.dumps(metadata["api_stats"], separators=(",", ":")) if metadata.get("api_stats") else None}
+
+    if file_exists:
+        with open(log_path, newline='') as f:
+            reader = csv.DictReader(f)
+            existing_header = reader.fieldnames or []
+            rows = list(reader) if existing_header != list(row.keys()) else None
+        # Logs written before the API stats columns existed get them once, then plain appends again
+        if rows is not None:
+            with open(log_path, mode='w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(row.keys()), extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
 
     with open(log_path, mode='a', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=metadata.keys())
+        writer = csv.DictWriter(f, fieldnames=row.keys())
         if not file_exists:
             writer.writeheader()
-        writer.writerow(metadata)
+        writer.writerow(row)
+
+# API call totals plus the per endpoint latency and attempt histograms of the run
+def add_api_stats(metadata, stats):
+    summary = stats.summary()
+    metadata["api_calls"] = summary["calls"]
+    metadata["api_attempts"] = summary["attempts"]
+    metadata["api_latency_seconds"] = summary["latency_seconds"]
+    metadata["api_retry_wait_seconds"] = summary["retry_wait_seconds"]
+    metadata["api_stats"] = summary["endpoints"]
+    stats.log_summary()
 
 # Step 1: Setup Logging
 def setup_logger():
@@ -63,91 +85,274 @@ def setup_logger():
     logging.info("Extracting data from Plaid Sandbox")
     return timestamp
 
+PLAID_HOSTS = {
+    "sandbox": "https://sandbox.plaid.com",
+    "production": "https://production.plaid.com",
+}
+
 # Step 2: Load API credentials from the env file by using dotenv module of python
 def load_credentials():
     load_dotenv()
     return {
         "client_id": os.getenv("PLAID_CLIENT_ID"),
         "secret": os.getenv("PLAID_SECRET"),
-        "env": os.getenv("PLAID_ENV", "sandbox")
+        "env": os.getenv("PLAID_ENV", "sandbox"),
+        # Overrides the host of PLAID_ENV, e.g. http://127.0.0.1:8765 for benchmarks/plaid_standin.py
+        "host": os.getenv("PLAID_HOST") or PLAID_HOSTS.get(os.getenv("PLAID_ENV", "sandbox"), PLAID_HOSTS["sandbox"]),
+        # Optional: comma separated access tokens of already linked items, a sandbox item is created per institution otherwise
+        "access_tokens": [t.strip() for t in os.getenv("PLAID_ACCESS_TOKENS", os.getenv("PLAID_ACCESS_TOKEN", "")).split(",") if t.strip()],
+        "institutions": [i.strip() for i in os.getenv("PLAID_SANDBOX_INSTITUTIONS", "ins_109508").split(",") if i.strip()],
+        # "sync" follows /transactions/sync cursors, "get" pages /transactions/get over a fixed window
+        "extract_mode": os.getenv("PLAID_EXTRACT_MODE", "sync"),
+        "page_size": int(os.getenv("PLAID_PAGE_SIZE", "500")),
+        "max_workers": int(os.getenv("PLAID_MAX_WORKERS", "4")),
+        # Requests per second shared by all workers, keep it under the Plaid limit for the endpoints we call
+        "rate_limit": float(os.getenv("PLAID_RATE_LIMIT_PER_SEC", "5")),
+        "rate_limit_burst": int(os.getenv("PLAID_RATE_LIMIT_BURST", "10")),
+        # Every Plaid call is retried with exponential backoff on retryable error codes, within an overall deadline
+        "retry_max_attempts": int(os.getenv("PLAID_RETRY_MAX_ATTEMPTS", "6")),
+        "retry_max_delay": float(os.getenv("PLAID_RETRY_MAX_DELAY", "30")),
+        "retry_deadline": float(os.getenv("PLAID_RETRY_DEADLINE_SECONDS", "120")),
+        # Compressed newline delimited JSON, "ndjson.zst" needs the optional zstandard package
+        "bronze_format": os.getenv("BRONZE_FORMAT", "ndjson.gz")
     }
 
+# List of items to extract, either linked access tokens or sandbox institutions to link on the fly
+def get_items(creds):
+    if creds["access_tokens"]:
+        return [{"access_token": token} for token in creds["access_tokens"]]
+    return [{"institution_id": institution} for institution in creds["institutions"]]
+
 # Step 3: Connect to Plaid creating a client object steup that can help us for further endpoints call
 def get_plaid_client(creds):
     configuration = Configuration(
-        host="https://sandbox.plaid.com",
+        host=creds.get("host", PLAID_HOSTS["sandbox"]),
         api_key={
             "clientId": creds["client_id"],
             "secret": creds["secret"],
         }
     )
+    # One pooled ApiClient is shared by all worker threads, size the pool so no worker waits for a connection
+    configuration.connection_pool_maxsize = max(creds.get("max_workers", 1), 1)
     api_client = ApiClient(configuration)
-    return plaid_api.PlaidApi(api_client)
+    client = plaid_api.PlaidApi(api_client)
+
+    limiter = TokenBucket(creds.get("rate_limit", 5), creds.get("rate_limit_burst", 10))
+    policy = RetryPolicy(
+        max_attempts=creds.get("retry_max_attempts", 6),
+        max_delay=creds.get("retry_max_delay", 30.0),
+        deadline=creds.get("retry_deadline", 120.0)
+    )
+    return RetryingClient(client, policy, ApiCallStats(), limiter)
+
+# === Cursor State ===
+# The last /transactions/sync cursor is kept per item so every run only pulls what changed since the previous one
+CURSOR_STATE_FILE = "data/state/plaid_cursors.json"
+
+def load_cursor(item_id, state_file=CURSOR_STATE_FILE):
+    return load_state(state_file).get(item_id)
+
+def save_cursor(item_id, cursor, state_file=CURSOR_STATE_FILE):
+    update_state(state_file, item_id, cursor)
+    logging.info(f"Saved sync cursor for item {item_id}")
+
+# Step 4: Get an access token for the item to extract
+def get_access_token(client, item):
+    # Reuse the configured item so the sync cursor stays valid across runs
+    if item.get("access_token"):
+        access_token = item["access_token"]
+        item_id = client.item_get(ItemGetRequest(access_token=access_token)).item.item_id
+        logging.info(f"Using configured access token for item {item_id}")
+        return access_token, item_id
 
-# Step 4: Get transactions from Plaid
-def fetch_transactions(client):
     # Create public token using the https://sandbox.plaid.com/sandbox/public_token/create endpoint
     public_token_response = client.sandbox_public_token_create(
         SandboxPublicTokenCreateRequest(
-            institution_id="ins_109508",
+            institution_id=item.get("institution_id", "ins_109508"),
             initial_products=[Products("transactions")],
         )
     )
     public_token = public_token_response.public_token
-    logging.info("Created sandbox public token")
+    logging.info(f"Created sandbox public token for {item.get('institution_id', 'ins_109508')}")
 
     # Exchange for access token givng the public token to this endpoint to get access token https://sandbox.plaid.com/item/public_token/exchange
     exchange_response = client.item_public_token_exchange(
         ItemPublicTokenExchangeRequest(public_token=public_token)
     )
-    access_token = exchange_response.access_token
     logging.info("Exchanged public token for access token")
+    return exchange_response.access_token, exchange_response.item_id
 
-    # Request transactions using https://sandbox.plaid.com/transactions/get endpoint
-    start_date = (datetime.now() - timedelta(days=30)).date()
-    end_date = datetime.now().date()
-    #request = TransactionsGetRequest(
-    #    access_token=access_token,
-    #    start_date=start_date,
-    #    end_date=end_date,
-    #    options=TransactionsGetRequestOptions(count=100, offset=0)
-    #)
+# Step 5a: Incremental extraction using https://sandbox.plaid.com/transactions/sync
+def fetch_transactions_sync(client, access_token, writer, cursor=None, page_size=500, max_retries=5):
+    accounts = []
+    next_cursor = cursor
+    attempt = 0
+    not_ready_attempts = 0
+    not_ready_since = time.monotonic()
+    policy = getattr(client, "retry_policy", None) or RetryPolicy()
 
-    #response = client.transactions_get(request)
+    while True:
+        request_args = {"access_token": access_token, "count": page_size}
+        # An empty cursor means "from the beginning of the item's history"
+        if next_cursor:
+            request_args["cursor"] = next_cursor
 
-    max_retries = 5
-    for attempt in range(max_retries):
         try:
-            request = TransactionsGetRequest(
-                access_token=access_token,
-                start_date=start_date,
-                end_date=end_date,
-                options=TransactionsGetRequestOptions(count=100, offset=0)
-            )
-            response = client.transactions_get(request)
-            logging.info("Pulled transaction data from Plaid")
-            #print("Pulled transaction data from Plaid")
-            break  # exit loop on success
-
+            response = client.transactions_sync(TransactionsSyncRequest(**request_args)).to_dict()
         except ApiException as e:
-            if "PRODUCT_NOT_READY" in str(e):
-                print(f"🔄 Transaction data not ready, retrying... ({attempt+1}/{max_retries})")
-                time.sleep(5)  # wait 5 seconds
-            else:
-                raise e
+            # Plaid asks to restart the whole pagination loop from the original cursor when data changed mid-way
+            if "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION" in str(e) and attempt < max_retries:
+                attempt += 1
+                logging.warning(f"Transactions changed during pagination, restarting sync ({attempt}/{max_retries})")
+                writer.reset()
+                next_cursor = cursor
+                continue
+            raise e
+
+        # A freshly linked item has no history yet on the first call, wait for Plaid to finish pulling it.
+        # This is a successful response, so the client does not retry it, the same backoff is applied here.
+        if not cursor and response.get("transactions_update_status") == "NOT_READY":
+            not_ready_attempts += 1
+            delay = policy.next_delay(not_ready_attempts, "NOT_READY", not_ready_since)
+            if delay is not None:
+                logging.warning(f"Transaction data not ready, retry {not_ready_attempts} in {delay:.1f}s")
+                stats = getattr(client, "stats", None)
+                if stats:
+                    stats.record_wait("transactions_sync", delay, "NOT_READY")
+                time.sleep(delay)
+                continue
+            logging.warning("Transaction data still not ready, continuing with what Plaid returned")
+
+        # Modified transactions carry the full record and are tagged, silver keeps the last version per transaction_id
+        writer.write_records("transaction", response.get("added", []))
+        writer.write_records("modified", response.get("modified", []))
+        writer.write_records("removed", response.get("removed", []))
+        accounts = response.get("accounts", accounts)
+        next_cursor = response.get("next_cursor")
 
-    return convert_dates(response.to_dict())
+        if not response.get("has_more"):
+            break
+
+    writer.write_records("account", accounts)
+    logging.info(
+        f"Synced {writer.counts.get('transaction', 0)} added, {writer.counts.get('modified', 0)} modified "
+        f"and {writer.counts.get('removed', 0)} removed transactions"
+    )
+    return next_cursor
 
-# Step 5: Save raw data to Bronze Layer
-def save_to_bronze(data, timestamp):
+# Step 5b: Full window extraction using https://sandbox.plaid.com/transactions/get, paging with offset
+def fetch_transactions_paginated(client, access_token, writer, days=30, page_size=500):
+    start_date = (datetime.now() - timedelta(days=days)).date()
+    end_date = datetime.now().date()
+
+    fetched = 0
+    accounts = []
+    total_transactions = None
+
+    while total_transactions is None or fetched < total_transactions:
+        # PRODUCT_NOT_READY and other retryable errors are retried with backoff by the client,
+        # whatever is left when the policy gives up is raised from here
+        request = TransactionsGetRequest(
+            access_token=access_token,
+            start_date=start_date,
+            end_date=end_date,
+            options=TransactionsGetRequestOptions(count=page_size, offset=fetched)
+        )
+        response = client.transactions_get(request).to_dict()
+
+        page = response.get("transactions", [])
+        writer.write_records("transaction", page)
+        fetched += len(page)
+        accounts = response.get("accounts", accounts)
+        total_transactions = response.get("total_transactions", 0)
+        logging.info(f"Pulled {fetched}/{total_transactions} transactions from Plaid")
+
+        # Guard against an endless loop if Plaid reports more rows than it returns
+        if not page:
+            break
+
+    writer.write_records("account", accounts)
+    return None
+
+# Step 5: Get transactions from Plaid and stream them into the bronze writer page by page
+def fetch_transactions(client, creds, access_token, item_id, writer):
+    if creds.get("extract_mode") == "get":
+        next_cursor = fetch_transactions_paginated(client, access_token, writer, page_size=creds.get("page_size", 500))
+    else:
+        cursor = load_cursor(item_id)
+        logging.info(f"Syncing item {item_id} from {'saved cursor' if cursor else 'the beginning'}")
+        next_cursor = fetch_transactions_sync(client, access_token, writer, cursor, page_size=creds.get("page_size", 500))
+
+    writer.write_records("meta", [{"item_id": item_id, "next_cursor": next_cursor}])
+    logging.info(f"Pulled transaction data from Plaid for item {item_id}")
+    return next_cursor
+
+# Step 6: Bronze Layer file for one item of a run
+def get_bronze_path(timestamp, item_id, bronze_format="ndjson.gz"):
     bronze_dir = "data/bronze"
-    os.makedirs(bronze_dir, exist_ok=True)
-    filename = os.path.join(bronze_dir, f"transactions_{timestamp}.json")
+    # Run timestamp first so the files of a run still sort together and after older runs
+    return os.path.join(bronze_dir, f"transactions_{timestamp}_{item_id}.{bronze_format}")
+
+# Step 7: Extract one item end to end, this is the unit of work each worker thread runs
+def extract_item(client, creds, item, timestamp):
+    access_token, item_id = get_access_token(client, item)
+    filename = get_bronze_path(timestamp, item_id, creds.get("bronze_format", "ndjson.gz"))
 
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=4)
+    with span("fetch", item_id=item_id) as s:
+        with BronzeWriter(filename) as writer:
+            next_cursor = fetch_transactions(client, creds, access_token, item_id, writer)
+        s.rows_out = transaction_count(writer.counts)
+        s.bytes_written = file_size(filename)
     logging.info(f"Raw transaction data saved to: {filename}")
 
+    # Only move the cursor forward once the delta is safely stored in bronze
+    if next_cursor:
+        save_cursor(item_id, next_cursor)
+    return transaction_count(writer.counts), filename
+
+# Step 7b: Same unit of work for the in-process pipeline, the records stay in memory for the silver stage
+# and the bronze file is written afterwards by persist_bronze
+def extract_item_in_memory(client, creds, item, timestamp):
+    access_token, item_id = get_access_token(client, item)
+    collector = RecordCollector()
+    with span("fetch", item_id=item_id) as s:
+        next_cursor = fetch_transactions(client, creds, access_token, item_id, collector)
+        s.rows_out = transaction_count(collector.counts)
+    return {
+        "item_id": item_id,
+        "filename": get_bronze_path(timestamp, item_id, creds.get("bronze_format", "ndjson.gz")),
+        "records": collector,
+        "next_cursor": next_cursor
+    }
+
+def persist_bronze(extracted):
+    # Runs in the background while the pipeline is already in the silver stage
+    with span("bronze_write", rows_in=len(extracted["records"].records), stage="extract", item_id=extracted["item_id"]) as s:
+        with BronzeWriter(extracted["filename"]) as writer:
+            writer.write_pairs(extracted["records"].records)
+        s.bytes_written = file_size(extracted["filename"])
+    logging.info(f"Raw transaction data saved to: {extracted['filename']}")
+
+    # Same rule as extract_item, the cursor only moves once the delta is in bronze
+    if extracted["next_cursor"]:
+        save_cursor(extracted["item_id"], extracted["next_cursor"])
+    return extracted["filename"]
+
+# Step 8: Fan out over all items, the total latency becomes the slowest item instead of the sum of all items
+def extract_all_items(client, creds, items, timestamp, extract_fn=extract_item):
+    results, errors = [], []
+    with ThreadPoolExecutor(max_workers=max(creds.get("max_workers", 1), 1)) as executor:
+        futures = {executor.submit(extract_fn, client, creds, item, timestamp): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            label = item.get("institution_id") or f"token ...{item['access_token'][-4:]}"
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logging.error(f"Extraction failed for item {label}", exc_info=True)
+                errors.append(f"{label}: {e}")
+    return results, errors
+
 # === Main ETL Flow ===
 if __name__ == "__main__":
     metadata = {
@@ -157,24 +362,36 @@ if __name__ == "__main__":
         "status": "FAILED",
         "records_extracted": 0,
         "file_written_to": None,
-        "error_message": None
+        "error_message": None,
+        "api_calls": None,
+        "api_attempts": None,
+        "api_latency_seconds": None,
+        "api_retry_wait_seconds": None,
+        "api_stats": None
     }
+    client = None
 
     try:
         ts = setup_logger()
+        set_run_context(ts, "extract")
         metadata["run_id"] = ts
         metadata["start_time"] = datetime.now().isoformat()
 
         creds = load_credentials()
         client = get_plaid_client(creds)
-        transactions = fetch_transactions(client)
+        items = get_items(creds)
+        logging.info(f"Extracting {len(items)} item(s) with {creds['max_workers']} worker(s)")
 
-        metadata["records_extracted"] = len(transactions.get("transactions", []))
+        results, errors = extract_all_items(client, creds, items, ts)
 
-        save_to_bronze(transactions, ts)
-        metadata["file_written_to"] = f"data/bronze/transactions_{ts}.json"
-        metadata["status"] = "SUCCESS"
-        logging.info("Data successfully extracted and stored to bronze layer.")
+        metadata["records_extracted"] = sum(count for count, _ in results)
+        metadata["file_written_to"] = ";".join(sorted(filename for _, filename in results))
+        if errors:
+            metadata["error_message"] = " | ".join(errors)
+            metadata["status"] = "PARTIAL" if results else "FAILED"
+        else:
+            metadata["status"] = "SUCCESS"
+        logging.info(f"{len(results)}/{len(items)} item(s) extracted and stored to bronze layer.")
 
     except Exception as e:
         logging.error("Extraction failed", exc_info=True)
@@ -182,5 +399,8 @@ if __name__ == "__main__":
 
     finally:
         metadata["end_time"] = datetime.now().isoformat()
+        if client is not None:
+            add_api_stats(metadata, client.stats)
+        log_event("run", "extract", **metadata)
         write_metadata_log(metadata)
         logging.info("Control metadata logged.")
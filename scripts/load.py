@@ -1,9 +1,14 @@
 import os
 import logging
-import pyodbc
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from dotenv import load_dotenv
+
+from db import ConnectionPool, bulk_insert, load_sql_credentials
+from state_store import load_state, update_state
+from run_log import set_run_context, log_event, span
+from reporting import refresh_aggregates
+from transaction_index import TransactionIndex
 
 # === Setup Logging ===
 def setup_logger():
@@ -26,68 +31,407 @@ def setup_logger():
 
 # === Load DB Credentials ===
 def load_db_credentials():
-    load_dotenv()
     return {
-        "server": os.getenv("SQL_SERVER"),
-        "database": os.getenv("SQL_DATABASE"),
-        "username": os.getenv("SQL_USERNAME"),
-        "password": os.getenv("SQL_PASSWORD")
+        **load_sql_credentials(),
+        "batch_size": int(os.getenv("SQL_BATCH_SIZE", "5000")),
+        # "python" resolves surrogate keys client side, "procedure" keeps Gold.sp_load_fact_transactions
+        "fact_loader": os.getenv("GOLD_FACT_LOADER", "python"),
+        # Gold steps running at the same time, also the size of the connection pool
+        "max_workers": int(os.getenv("GOLD_MAX_WORKERS", "2"))
     }
 
-# === Log Metadata ===
-def update_metadata_log(proc_name, status, timestamp):
-    metadata_file = "logs/gold/metadata_log.csv"
-    os.makedirs(os.path.dirname(metadata_file), exist_ok=True)
-    log_entry = {
-        "procedure": proc_name,
-        "timestamp": timestamp,
-        "status": status,
-        "layer": "Gold"
-    }
-    df = pd.DataFrame([log_entry])
-    if os.path.exists(metadata_file):
-        df.to_csv(metadata_file, mode='a', header=False, index=False)
+# === Call Stored Procedure ===
+# The gold procedures end with SELECT <rows> AS rows_affected, older versions simply return no result set
+def call_stored_procedure(procedure_name, conn, load_batch_id):
+    cursor = conn.cursor()
+    logging.info(f"Executing: {procedure_name} for batch {load_batch_id}")
+    cursor.execute(f"EXEC {procedure_name} @load_batch_id = ?", (load_batch_id,))
+    row = cursor.fetchone() if cursor.description else None
+    conn.commit()
+    cursor.close()
+    logging.info(f"Successfully executed: {procedure_name}")
+    return row[0] if row else None
+
+# === Dimension Caches ===
+# account_id -> current account_sk and (primary, detailed) -> category_sk, kept between runs and
+# refreshed only with dimension rows above the last seen surrogate key (new SCD2 versions always get a higher sk)
+DIM_CACHE_FILE = "data/state/gold_dim_cache.json"
+CATEGORY_KEY_SEP = "\x1f"
+
+def category_key(primary, detailed):
+    # Same NULL handling as the ISNULL(..., '') join in the stored procedures
+    return primary.fillna("").astype(str) + CATEGORY_KEY_SEP + detailed.fillna("").astype(str)
+
+def load_dim_cache():
+    cache = load_state(DIM_CACHE_FILE).get("cache")
+    return cache or {"accounts": {}, "account_hwm": 0, "categories": {}, "category_hwm": 0}
+
+def refresh_dim_cache(conn, cache):
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "SELECT account_id, account_sk FROM Gold.dim_account "
+        "WHERE current_flag = 1 AND account_sk > ? ORDER BY account_sk",
+        (cache["account_hwm"],)
+    )
+    new_accounts = cursor.fetchall()
+    for account_id, account_sk in new_accounts:
+        cache["accounts"][account_id] = account_sk
+        cache["account_hwm"] = max(cache["account_hwm"], account_sk)
+
+    cursor.execute(
+        "SELECT primary_category, detailed_category, category_sk FROM Gold.dim_category "
+        "WHERE category_sk > ? ORDER BY category_sk",
+        (cache["category_hwm"],)
+    )
+    new_categories = cursor.fetchall()
+    for primary, detailed, category_sk in new_categories:
+        cache["categories"][f"{primary or ''}{CATEGORY_KEY_SEP}{detailed or ''}"] = category_sk
+        cache["category_hwm"] = max(cache["category_hwm"], category_sk)
+
+    # dim_date is one contiguous range, its bounds are enough to know which date_sk exist
+    cursor.execute("SELECT MIN(date_sk), MAX(date_sk) FROM Gold.dim_date")
+    cache["date_sk_min"], cache["date_sk_max"] = cursor.fetchone()
+    cursor.close()
+
+    update_state(DIM_CACHE_FILE, "cache", cache)
+    logging.info(f"Dimension cache refreshed: {len(new_accounts)} new account version(s), {len(new_categories)} new categories")
+    return cache
+
+# === Date Dimension ===
+# One row per day for a whole range at once, same columns and names as Load_dim_date_table.sql
+def build_date_rows(start, end):
+    dates = pd.date_range(start, end, freq="D")
+    return pd.DataFrame({
+        "date_sk": dates.year * 10000 + dates.month * 100 + dates.day,
+        "date": dates.date,
+        "day": dates.day,
+        "month": dates.month,
+        "month_name": dates.month_name(),
+        "year": dates.year,
+        "quarter": dates.quarter,
+        "day_of_week": dates.day_name()
+    })
+
+def date_from_sk(date_sk):
+    return pd.Timestamp(year=date_sk // 10000, month=date_sk // 100 % 100, day=date_sk % 100)
+
+# Grows dim_date so it covers every date of the batch before the fact load, in whole calendar years,
+# on either side of the existing range only so the dimension stays one contiguous range
+def extend_dim_date(conn, load_batch_id, batch_size=5000):
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(date), MAX(date) FROM Silver.stg_transactions WHERE load_batch_id = ?", (load_batch_id,))
+    batch_min, batch_max = cursor.fetchone()
+    cursor.execute("SELECT MIN(date_sk), MAX(date_sk) FROM Gold.dim_date")
+    dim_min, dim_max = cursor.fetchone()
+    cursor.close()
+
+    if batch_min is None:
+        return 0
+    batch_min = pd.Timestamp(batch_min).to_period("Y").start_time
+    batch_max = pd.Timestamp(batch_max).to_period("Y").end_time.normalize()
+
+    if dim_min is None:
+        ranges = [(batch_min, batch_max)]
     else:
-        df.to_csv(metadata_file, index=False)
-    logging.info(f"Metadata logged for procedure: {proc_name}")
+        dim_min, dim_max = date_from_sk(dim_min), date_from_sk(dim_max)
+        ranges = []
+        if batch_min < dim_min:
+            ranges.append((batch_min, dim_min - pd.Timedelta(days=1)))
+        if batch_max > dim_max:
+            ranges.append((dim_max + pd.Timedelta(days=1), batch_max))
 
-# === Call Stored Procedure ===
-def call_stored_procedure(procedure_name, creds, timestamp):
-    conn_str = (
-        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-        f"SERVER={creds['server']};"
-        f"DATABASE={creds['database']};"
-        f"UID={creds['username']};"
-        f"PWD={creds['password']}"
+    inserted = 0
+    for start, end in ranges:
+        inserted += bulk_insert(conn, build_date_rows(start, end), "Gold.dim_date", batch_size=batch_size)
+        logging.info(f"Extended Gold.dim_date with {start.date()} to {end.date()}")
+    return inserted
+
+# === Resolve Surrogate Keys ===
+def resolve_fact_keys(stg_df, cache):
+    fact_df = pd.DataFrame({"transaction_id": stg_df["transaction_id"]})
+    fact_df["account_sk"] = stg_df["account_id"].map(cache["accounts"])
+
+    dates = pd.to_datetime(stg_df["date"], errors="coerce")
+    fact_df["date_sk"] = dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day
+    in_dim_date = fact_df["date_sk"].between(cache["date_sk_min"] or 0, cache["date_sk_max"] or 0)
+
+    fact_df["merchant_name"] = stg_df["merchant_name"].str.strip().str.lower()
+    fact_df["amount"] = stg_df["amount"]
+    fact_df["currency_code"] = stg_df["iso_currency_code"].fillna("USD")
+    fact_df["payment_channel"] = stg_df["payment_channel"].fillna("online")
+    fact_df["category_sk"] = category_key(
+        stg_df["personal_finance_category_primary"], stg_df["personal_finance_category_detailed"]
+    ).map(cache["categories"])
+    fact_df["pending_flag"] = (stg_df["pending"] == 1).astype(int)
+
+    # Inner join semantics of the stored procedure for account and date, category stays a left join
+    resolved = fact_df["account_sk"].notna() & in_dim_date
+    if (~resolved).any():
+        logging.warning(f"Skipping {(~resolved).sum()} transaction(s) without a current account or a dim_date row")
+    fact_df = fact_df[resolved].astype({"account_sk": "int64", "date_sk": "int64"})
+    fact_df["category_sk"] = fact_df["category_sk"].astype("Int64")
+    return fact_df
+
+# === Fact Change Log ===
+# Every fact row written is logged with sign 1, every row replaced or deleted with sign -1,
+# see DBScripts/Reporting_Aggreated_Views/ddl_reporting_aggregates.sql
+CHANGE_COLUMNS = ["transaction_id", "account_sk", "date_sk", "merchant_name", "amount", "category_sk", "pending_flag"]
+
+def change_rows(fact_df, load_batch_id, sign):
+    changes = fact_df[CHANGE_COLUMNS].copy()
+    changes.insert(0, "load_batch_id", load_batch_id)
+    changes["sign"] = sign
+    return changes
+
+# === Python Fact Loader ===
+FACT_COLUMNS = ["account_sk", "date_sk", "merchant_name", "amount", "currency_code", "payment_channel", "category_sk", "pending_flag"]
+
+def read_frame(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    columns = [col[0] for col in cursor.description]
+    df = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+    cursor.close()
+    return df
+
+# NaN / pd.NA become None, numpy scalars plain Python values
+def to_rows(df):
+    values = df.astype(object)
+    return list(values.where(values.notna(), None).itertuples(index=False, name=None))
+
+# Fact rows from the server (Decimal amounts, BIT flags, NULLs) and resolved ones compare equal when nothing changed
+def comparable(df):
+    return pd.DataFrame({
+        "account_sk": df["account_sk"].astype("int64"),
+        "date_sk": df["date_sk"].astype("int64"),
+        "merchant_name": df["merchant_name"].fillna("").astype(str),
+        "amount": pd.to_numeric(df["amount"]).astype(float).round(2),
+        "currency_code": df["currency_code"].fillna("").astype(str),
+        "payment_channel": df["payment_channel"].fillna("").astype(str),
+        "category_sk": pd.to_numeric(df["category_sk"]).fillna(-1).astype("int64"),
+        "pending_flag": df["pending_flag"].astype(int),
+    }, index=df.index)
+
+# The fact rows a batch's staged transactions resolve to, the same transaction can be staged by overlapping
+# extracts, the last staged version wins. row_hash is the staged version's content hash.
+def read_staged_facts(conn, cache, load_batch_id):
+    stg_df = read_frame(
+        conn,
+        "SELECT st.transaction_id, st.account_id, st.date, st.merchant_name, st.amount, st.iso_currency_code, "
+        "st.payment_channel, st.pending, st.personal_finance_category_primary, st.personal_finance_category_detailed, "
+        "st.row_hash FROM Silver.stg_transactions st WHERE st.load_batch_id = ?",
+        (load_batch_id,)
+    )
+    if stg_df.empty:
+        return pd.DataFrame(columns=["transaction_id"] + FACT_COLUMNS + ["row_hash"])
+    stg_df = stg_df.drop_duplicates("transaction_id", keep="last")
+    fact_df = resolve_fact_keys(stg_df, cache)
+    fact_df["row_hash"] = stg_df.loc[fact_df.index, "row_hash"]
+    return fact_df
+
+# New transactions are inserted, changed ones updated in place and the ones in Plaid's removed list deleted.
+# The fact rows and their change log rows (1 for the version written, -1 for the version replaced or deleted)
+# commit together, so the reporting aggregates follow every insert, update and delete.
+def load_fact_transactions(conn, cache, load_batch_id, batch_size=5000):
+    fact_df = read_staged_facts(conn, cache, load_batch_id).drop(columns="row_hash")
+    removed_ids = set(read_frame(
+        conn, "SELECT transaction_id FROM Silver.stg_removed_transactions WHERE load_batch_id = ?", (load_batch_id,)
+    )["transaction_id"])
+    # Only the fact rows this batch touches, matched on the server
+    existing_df = read_frame(
+        conn,
+        f"SELECT ft.transaction_id, {', '.join(f'ft.{c}' for c in FACT_COLUMNS)} FROM Gold.fact_transactions ft "
+        "WHERE ft.transaction_id IN (SELECT transaction_id FROM Silver.stg_transactions WHERE load_batch_id = ?) "
+        "OR ft.transaction_id IN (SELECT transaction_id FROM Silver.stg_removed_transactions WHERE load_batch_id = ?)",
+        (load_batch_id, load_batch_id)
+    ).set_index("transaction_id")
+
+    known = fact_df["transaction_id"].isin(existing_df.index).to_numpy(dtype=bool)
+    new_df = fact_df[~known]
+    staged_df = fact_df[known].set_index("transaction_id")
+    old_df = existing_df.loc[staged_df.index]
+    changed = (comparable(staged_df) != comparable(old_df)).any(axis=1)
+    updated_df = staged_df[changed].reset_index()
+    replaced_df = old_df[changed].reset_index()
+    deleted_df = existing_df[existing_df.index.isin(removed_ids) & ~existing_df.index.isin(fact_df["transaction_id"])].reset_index()
+
+    if new_df.empty and updated_df.empty and deleted_df.empty:
+        logging.info("No new, changed or removed transactions for Gold.fact_transactions")
+        return 0
+
+    changes = pd.concat([
+        change_rows(deleted_df, load_batch_id, -1),
+        change_rows(replaced_df, load_batch_id, -1),
+        change_rows(updated_df, load_batch_id, 1),
+        change_rows(new_df, load_batch_id, 1),
+    ], ignore_index=True)
+    cursor = conn.cursor()
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+    try:
+        if not deleted_df.empty:
+            cursor.executemany("DELETE FROM Gold.fact_transactions WHERE transaction_id = ?", to_rows(deleted_df[["transaction_id"]]))
+        if not updated_df.empty:
+            cursor.executemany(
+                f"UPDATE Gold.fact_transactions SET {', '.join(f'{c} = ?' for c in FACT_COLUMNS)} WHERE transaction_id = ?",
+                to_rows(updated_df[FACT_COLUMNS + ["transaction_id"]])
+            )
+        bulk_insert(conn, new_df, "Gold.fact_transactions", batch_size=batch_size, commit=False)
+        bulk_insert(conn, changes, "Gold.fact_transaction_changes", batch_size=batch_size, commit=False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    logging.info(
+        f"Gold.fact_transactions: {len(new_df)} transaction(s) inserted, {len(updated_df)} updated, {len(deleted_df)} deleted"
     )
+    return len(new_df) + len(updated_df) + len(deleted_df)
+
+# === Gold Step DAG ===
+# step name -> (function(conn) returning the row count, names of the steps it depends on)
+def build_gold_steps(creds, load_batch_id):
+    def python_fact_load(conn):
+        cache = refresh_dim_cache(conn, load_dim_cache())
+        return load_fact_transactions(conn, cache, load_batch_id, creds["batch_size"])
+
+    def procedure(name):
+        return lambda conn: call_stored_procedure(name, conn, load_batch_id)
+
+    dimensions = ["Gold.sp_upsert_dim_account", "Gold.sp_load_dim_category"]
+    steps = {name: (procedure(name), []) for name in dimensions}
+    # Both fact loaders inner join dim_date, so it has to cover the batch first
+    steps["python.extend_dim_date"] = (lambda conn: extend_dim_date(conn, load_batch_id, creds["batch_size"]), [])
+    dimensions = dimensions + ["python.extend_dim_date"]
+    if creds["fact_loader"] == "procedure":
+        steps["Gold.sp_load_fact_transactions"] = (procedure("Gold.sp_load_fact_transactions"), dimensions)
+    else:
+        steps["python.load_fact_transactions"] = (python_fact_load, dimensions)
+    return steps
+
+def run_step(name, step_fn, pool, load_batch_id=None):
     try:
-        with pyodbc.connect(conn_str) as conn:
-            cursor = conn.cursor()
-            logging.info(f"Executing: {procedure_name}")
-            cursor.execute(f"EXEC {procedure_name}")
-            conn.commit()
-            logging.info(f"Successfully executed: {procedure_name}")
-            update_metadata_log(procedure_name, "Success", timestamp)
+        # The span records duration, rows and status of the step in the run log
+        with span(name, load_batch_id=load_batch_id) as s, pool.connection() as conn:
+            s.rows_out = step_fn(conn)
+        return "Success"
     except Exception as e:
-        logging.error(f"Failed to execute {procedure_name}: {e}", exc_info=True)
-        update_metadata_log(procedure_name, "Failed", timestamp)
+        logging.error(f"Failed to execute {name}: {e}", exc_info=True)
+        return "Failed"
+
+# Steps start as soon as all of their dependencies succeeded, independent steps run concurrently,
+# and a step whose dependency failed (or was skipped) is skipped instead of running on partial data
+def run_gold_dag(steps, pool, max_workers=2, load_batch_id=None):
+    results = {}
+    running = {}
+
+    def schedule_ready(executor):
+        changed = True
+        while changed:
+            changed = False
+            for name, (step_fn, deps) in steps.items():
+                if name in results or name in running.values():
+                    continue
+                if any(results.get(dep) in ("Failed", "Skipped") for dep in deps):
+                    logging.warning(f"Skipping {name}, a dependency did not succeed")
+                    log_event("skipped", name, status="Skipped", load_batch_id=load_batch_id)
+                    results[name] = "Skipped"
+                    changed = True
+                elif all(results.get(dep) == "Success" for dep in deps):
+                    running[executor.submit(run_step, name, step_fn, pool, load_batch_id)] = name
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        schedule_ready(executor)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+            schedule_ready(executor)
+    return results
+
+# === Load Batches ===
+# Batches are processed oldest first, one at a time, so SCD2 versions are applied in the order they were staged
+def get_pending_batches(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT load_batch_id FROM Silver.load_batches WHERE status = 'Staged' ORDER BY load_batch_id")
+    batches = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return batches
+
+# The fact table has the batch now, the local transaction index learns the loaded versions (so later extracts
+# skip them) and forgets the removed ids. A crash before finish_batch just loads and records the batch again.
+# Only transactions whose fact row holds the staged version are recorded: one skipped for a missing account
+# or dim_date row keeps its old fact row (or none), stays out of the index and is staged again next time.
+def record_loaded_transactions(conn, cache, load_batch_id):
+    fact_df = read_staged_facts(conn, cache, load_batch_id).set_index("transaction_id")
+    stored_df = read_frame(
+        conn,
+        f"SELECT ft.transaction_id, {', '.join(f'ft.{c}' for c in FACT_COLUMNS)} FROM Gold.fact_transactions ft "
+        "WHERE ft.transaction_id IN (SELECT transaction_id FROM Silver.stg_transactions WHERE load_batch_id = ?)",
+        (load_batch_id,)
+    ).set_index("transaction_id")
+    fact_df = fact_df[fact_df.index.isin(stored_df.index)]
+    matches = (comparable(fact_df) == comparable(stored_df.loc[fact_df.index])).all(axis=1)
+    loaded_df = fact_df[matches].reset_index()
+    removed_df = read_frame(
+        conn, "SELECT transaction_id FROM Silver.stg_removed_transactions WHERE load_batch_id = ?", (load_batch_id,)
+    )
+    with TransactionIndex() as index:
+        index.mark_loaded(loaded_df["transaction_id"], loaded_df["row_hash"], load_batch_id)
+        index.remove(removed_df["transaction_id"])
+    logging.info(f"Transaction index: {len(loaded_df)} loaded, {len(removed_df)} removed for batch {load_batch_id}")
+
+# Gold is done with the batch, its staging rows are purged so staging only ever holds unprocessed deltas
+def finish_batch(conn, load_batch_id):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Silver.stg_transactions WHERE load_batch_id = ?", (load_batch_id,))
+    cursor.execute("DELETE FROM Silver.stg_accounts WHERE load_batch_id = ?", (load_batch_id,))
+    cursor.execute("DELETE FROM Silver.stg_removed_transactions WHERE load_batch_id = ?", (load_batch_id,))
+    cursor.execute(
+        "UPDATE Silver.load_batches SET status = 'Processed', processed_at = GETDATE() WHERE load_batch_id = ?",
+        (load_batch_id,)
+    )
+    conn.commit()
+    cursor.close()
+    logging.info(f"Purged staging rows of processed batch {load_batch_id}")
+
+# === Gold Stage ===
+# Returns True when every staged batch went through
+def run_gold(creds):
+    pool = ConnectionPool(creds, creds["max_workers"])
+    try:
+        with pool.connection() as conn:
+            batches = get_pending_batches(conn)
+        logging.info(f"{len(batches)} staged batch(es) to process")
+
+        for batch_id in batches:
+            results = run_gold_dag(build_gold_steps(creds, batch_id), pool, creds["max_workers"], batch_id)
+            if not all(status == "Success" for status in results.values()):
+                # Later batches wait, they may carry newer versions of the same accounts
+                logging.error(f"Gold failed for batch {batch_id}: {results}")
+                return False
+            with pool.connection() as conn:
+                record_loaded_transactions(conn, refresh_dim_cache(conn, load_dim_cache()), batch_id)
+                finish_batch(conn, batch_id)
+
+        # Fold the new fact rows into the reporting aggregates once, after the last batch
+        with pool.connection() as conn:
+            refresh_aggregates(conn)
+    finally:
+        pool.close_all()
+    return True
 
 # === Main ===
 if __name__ == "__main__":
     try:
         ts = setup_logger()
+        set_run_context(ts, "gold")
         creds = load_db_credentials()
 
-        procedures = [
-            "Gold.sp_upsert_dim_account",
-            "Gold.sp_load_dim_category",
-            "Gold.sp_load_fact_transactions"
-        ]
-
-        for proc in procedures:
-            call_stored_procedure(proc, creds, ts)
-
-        logging.info("Gold Layer completed successfully!")
+        if run_gold(creds):
+            logging.info("Gold Layer completed successfully!")
 
     except Exception as e:
         logging.error("Gold layer failed.", exc_info=True)
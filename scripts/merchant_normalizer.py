@@ -0,0 +1,272 @@
+import os
+import re
+import time
+import logging
+import sqlite3
+import difflib
+import pandas as pd
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from state_store import load_state
+
+# === Merchant Normalization ===
+# Maps raw merchant, counterparty and payee strings to one canonical (lower case) merchant, so
+# "AMZN Mktp US*2K4", "Amazon.com" and "amazon" all count towards the same merchant downstream:
+#   1. rules: lower case, processor prefixes (SQ *, TST*, PAYPAL *), store numbers, * references,
+#      domains, legal suffixes and punctuation are stripped, then known aliases are applied
+#   2. fuzzy: a cleaned name close enough to an already known canonical merchant joins it
+#   3. anything else becomes a new canonical merchant
+# Raw strings repeat across millions of transactions, every distinct raw string is resolved once and
+# remembered in a size bounded LRU memo that is persisted between runs. Only unseen strings pay for matching.
+# The cache is a local SQLite file shared by the silver worker processes:
+#   merchant_memo        raw string -> canonical merchant, at most MERCHANT_CACHE_SIZE rows, least recently used evicted
+#   merchant_names       cleaned name -> canonical merchant, kept so a canonical merchant never changes once written,
+#                        whatever order later runs or parallel worker processes see the spellings in
+#   merchant_canonicals  canonical merchants by their first two characters, the fuzzy candidates
+# Both unbounded tables are indexed and only read for the names of unseen strings, never loaded whole.
+
+MERCHANT_CACHE_FILE = "data/state/merchant_cache.sqlite"
+LEGACY_CACHE_FILE = "data/state/merchant_cache.json"
+LOOKUP_CHUNK = 900            # values per IN (...) lookup, below SQLite's bound parameter limit on every build
+FUZZY_CUTOFF = 0.9
+FUZZY_MIN_LENGTH = 6          # short names are too easy to confuse ("shell" / "shells")
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS merchant_memo (raw TEXT PRIMARY KEY, canonical TEXT NOT NULL, used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS ix_merchant_memo_used ON merchant_memo (used);
+CREATE TABLE IF NOT EXISTS merchant_names (name TEXT PRIMARY KEY, canonical TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS merchant_canonicals (prefix TEXT NOT NULL, canonical TEXT NOT NULL, PRIMARY KEY (prefix, canonical)) WITHOUT ROWID;
+"""
+
+PROCESSOR_PREFIX = re.compile(r"^(?:sq|tst|sp|pp|paypal|py|pos|in|dd|ach|chk)\s?\*\s*")
+PURCHASE_PREFIX = re.compile(r"^(?:pos debit|pos purchase|debit card purchase|purchase|recurring payment)\s+")
+STORE_NUMBER = re.compile(r"#\s*\d+|\bstore\s+\d+\b|\b[a-z]?\d{3,}\b")
+DOMAIN = re.compile(r"^www\.|\.(?:com|net|org|co|io)\b")
+LEGAL_SUFFIX = re.compile(r"\b(?:inc|llc|ltd|corp|co)\b\.?$")
+NON_WORD = re.compile(r"[^a-z0-9&]+")
+
+# Cleaned name -> canonical merchant, for spellings the rules alone don't bring together
+MERCHANT_ALIASES = {
+    "amzn": "amazon",
+    "amzn mktp us": "amazon",
+    "amzn mktp": "amazon",
+    "amazon marketplace": "amazon",
+    "amazon mktplace": "amazon",
+    "wal mart": "walmart",
+    "wm supercenter": "walmart",
+    "walmart supercenter": "walmart",
+    "mcdonald s": "mcdonalds",
+    "starbucks coffee": "starbucks",
+    "uber trip": "uber",
+    "uber eats": "uber eats",
+    "lyft ride": "lyft",
+    "netflix": "netflix",
+    "spotify usa": "spotify",
+    "apple com bill": "apple",
+    "google": "google",
+}
+
+def clean_merchant(raw):
+    name = " ".join(str(raw).lower().split())
+    name = PROCESSOR_PREFIX.sub("", name)
+    name = PURCHASE_PREFIX.sub("", name)
+    # "AMZN Mktp US*2K4LM", "UBER *TRIP": what follows the * is a reference or descriptor
+    name = name.split("*", 1)[0] or name
+    name = DOMAIN.sub(" ", name)
+    name = STORE_NUMBER.sub(" ", name)
+    name = NON_WORD.sub(" ", name).strip()
+    name = LEGAL_SUFFIX.sub("", name).strip()
+    # A name that is nothing but a store number or reference keeps its plain lower case form
+    return name or " ".join(str(raw).lower().split())
+
+def clean_name(raw):
+    name = clean_merchant(raw)
+    return MERCHANT_ALIASES.get(name, name)
+
+class MerchantNormalizer:
+    def __init__(self, cache_file=MERCHANT_CACHE_FILE, max_size=50000, legacy_cache_file=LEGACY_CACHE_FILE):
+        self.max_size = max_size
+        self.memo = OrderedDict()      # raw string -> canonical merchant, least recently used first
+        self.touched = set()           # memo entries hit since the last save, their last use is written back on save
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # Transactions are begun explicitly, BEGIN IMMEDIATE waits up to timeout seconds for the write lock
+        self.conn = sqlite3.connect(cache_file, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(CACHE_SCHEMA)
+        self._seed(legacy_cache_file)
+        # Warm start with the memo entries of earlier runs, the most recently used last
+        self.memo.update(self.conn.execute("SELECT raw, canonical FROM merchant_memo ORDER BY used"))
+        self._trim()
+
+    @contextmanager
+    def _write(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    # A new cache gets the alias canonicals and, once, whatever the old JSON cache file knew
+    def _seed(self, legacy_cache_file):
+        with self._write() as conn:
+            if conn.execute("SELECT COUNT(*) FROM merchant_canonicals").fetchone()[0]:
+                return
+            state = load_state(legacy_cache_file) if os.path.exists(legacy_cache_file) else {}
+            names = dict(state.get("names", {}))
+            # Cache files written before names was kept only have the memo
+            for raw, canonical in state.get("memo", {}).items():
+                names.setdefault(clean_name(raw), canonical)
+            canonicals = set(MERCHANT_ALIASES.values()) | set(names.values())
+            conn.executemany("INSERT OR IGNORE INTO merchant_names (name, canonical) VALUES (?, ?)", names.items())
+            conn.executemany(
+                "INSERT OR IGNORE INTO merchant_canonicals (prefix, canonical) VALUES (?, ?)",
+                [(canonical[:2], canonical) for canonical in canonicals]
+            )
+            used = time.time()
+            memo = list(state.get("memo", {}).items())[-self.max_size:] if self.max_size else []
+            conn.executemany(
+                "INSERT OR IGNORE INTO merchant_memo (raw, canonical, used) VALUES (?, ?, ?)",
+                [(raw, canonical, used + n * 1e-6) for n, (raw, canonical) in enumerate(memo)]
+            )
+        if names:
+            logging.info(f"Moved {len(names)} merchant name(s) from {legacy_cache_file} to the merchant cache")
+
+    def _trim(self):
+        while len(self.memo) > self.max_size:
+            self.memo.popitem(last=False)
+
+    # column value -> canonical merchant for the given values that are in table
+    def _lookup(self, table, column, values):
+        values = list(dict.fromkeys(values))
+        found = {}
+        for start in range(0, len(values), LOOKUP_CHUNK):
+            chunk = values[start:start + LOOKUP_CHUNK]
+            found.update(self.conn.execute(
+                f"SELECT {column}, canonical FROM {table} WHERE {column} IN ({', '.join(['?'] * len(chunk))})", chunk
+            ))
+        return found
+
+    # candidates holds the canonical merchants of every first-two-characters bucket read so far
+    def _match(self, name, candidates):
+        prefix = name[:2]
+        if prefix not in candidates:
+            candidates[prefix] = [c for (c,) in self.conn.execute(
+                "SELECT canonical FROM merchant_canonicals WHERE prefix = ?", (prefix,)
+            )]
+        bucket = candidates[prefix]
+        canonical = name
+        if name not in bucket and len(name) >= FUZZY_MIN_LENGTH:
+            close = difflib.get_close_matches(name, bucket, n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                canonical = close[0]
+        if canonical not in bucket:
+            bucket.append(canonical)
+        return canonical
+
+    # Unseen strings are resolved under the cache's write lock, so whichever worker process gets there first
+    # decides a new spelling's canonical merchant and every other process reads it back. Only the entries that
+    # are new are written, the cost follows the number of unseen strings, not the size of the cache.
+    # The lock is SQLite's own, a process that dies holding it releases it with its file handles.
+    def resolve_unseen(self, raws):
+        with self._write() as conn:
+            resolved = self._lookup("merchant_memo", "raw", raws)
+            names = {raw: clean_name(raw) for raw in raws if raw not in resolved}
+            known = self._lookup("merchant_names", "name", names.values())
+            new_names, candidates = {}, {}
+            for raw, name in names.items():
+                if name not in known:
+                    known[name] = new_names[name] = self._match(name, candidates)
+                resolved[raw] = known[name]
+            used = time.time()
+            conn.executemany("INSERT INTO merchant_names (name, canonical) VALUES (?, ?)", new_names.items())
+            conn.executemany(
+                "INSERT OR IGNORE INTO merchant_canonicals (prefix, canonical) VALUES (?, ?)",
+                [(canonical[:2], canonical) for canonical in set(new_names.values())]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO merchant_memo (raw, canonical, used) VALUES (?, ?, ?)",
+                [(raw, resolved[raw], used) for raw in raws]
+            )
+            # The memo stays within max_size, the least recently used entries go first
+            conn.execute(
+                "DELETE FROM merchant_memo WHERE raw IN (SELECT raw FROM merchant_memo ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            )
+        for raw in raws:
+            self.memo[raw] = resolved[raw]
+            self.memo.move_to_end(raw)
+        self._trim()
+        self.misses += len(raws)
+        return {raw: resolved[raw] for raw in raws}
+
+    def resolve(self, raw):
+        return self.normalize_series(pd.Series([raw])).iloc[0]
+
+    # Each distinct value is resolved once per call, missing and blank values stay missing
+    def normalize_series(self, series):
+        values = series.astype(object)
+        mapping, unseen = {}, []
+        for raw in pd.unique(values.dropna()):
+            if not str(raw).strip():
+                continue
+            canonical = self.memo.get(raw)
+            if canonical is None:
+                unseen.append(raw)
+            else:
+                mapping[raw] = canonical
+                self.memo.move_to_end(raw)
+        self.touched.update(mapping)
+        self.hits += len(mapping)
+        if unseen:
+            mapping.update(self.resolve_unseen(unseen))
+        # Blank strings are not in the mapping and come out missing like None
+        return values.map(mapping)
+
+    # New strings are written as they are resolved, this only records when the cached ones were last used
+    def save(self):
+        if self.touched:
+            used = time.time()
+            with self._write() as conn:
+                conn.executemany("UPDATE merchant_memo SET used = ? WHERE raw = ?", [(used, raw) for raw in self.touched])
+            self.touched = set()
+        if self.hits or self.misses:
+            logging.info(f"Merchant cache: {self.hits} hit(s), {self.misses} new string(s), {len(self.memo)} cached")
+        self.hits = self.misses = 0
+
+    def close(self):
+        self.conn.close()
+
+# One normalizer per process, loaded on first use (after .env is loaded).
+# A worker process forked from a parent that already had one opens its own connection.
+_normalizer = None
+_normalizer_pid = None
+
+def get_normalizer():
+    global _normalizer, _normalizer_pid
+    if _normalizer is None or _normalizer_pid != os.getpid():
+        _normalizer = MerchantNormalizer(max_size=int(os.getenv("MERCHANT_CACHE_SIZE", "50000")))
+        _normalizer_pid = os.getpid()
+    return _normalizer
+
+def save_merchant_cache():
+    if _normalizer is not None and _normalizer_pid == os.getpid():
+        _normalizer.save()
+
+# === Normalize Transaction Frame ===
+# merchant_name, counterparty_name and payment_meta_payee are mapped to canonical merchants,
+# a missing merchant_name is taken from the counterparty, then the payee
+def normalize_merchant_columns(df):
+    normalizer = get_normalizer()
+    for column in ["merchant_name", "counterparty_name", "payment_meta_payee"]:
+        if column in df.columns:
+            df[column] = normalizer.normalize_series(df[column])
+    if "merchant_name" in df.columns:
+        for fallback in ["counterparty_name", "payment_meta_payee"]:
+            if fallback in df.columns:
+                df["merchant_name"] = df["merchant_name"].fillna(df[fallback])
+    return df
@@ -0,0 +1,193 @@
+import os
+import sys
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import extract
+import transform
+import load
+from db import get_connection
+from bronze_io import transaction_count
+from state_store import load_state, save_state
+from run_log import set_run_context, log_event, span
+
+# === In-Process Pipeline ===
+# Runs extract -> silver -> gold in one process. The extracted records are handed to the silver transform
+# in memory instead of being read back from bronze, bronze files are still written (in the background) and silver
+# files are written chunk by chunk by the transform, so the medallion layers and the standalone scripts keep working.
+
+STAGES = ["extract", "silver", "gold"]
+PIPELINE_CHECKPOINT_FILE = "data/state/pipeline_checkpoint.json"
+
+# Step 1: Setup Logging
+def setup_logger():
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    log_dir = "logs/pipeline"
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, f"pipeline_{timestamp}.log")
+
+    logging.basicConfig(
+        filename=log_file,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    console.setFormatter(formatter)
+    logging.getLogger().addHandler(console)
+
+    logging.info("Starting in-process pipeline run")
+    return timestamp
+
+# Step 2: Stage Checkpoint
+# The run id and the stages it finished, --resume picks up an unfinished run at its first open stage
+def load_checkpoint(resume, timestamp):
+    checkpoint = load_state(PIPELINE_CHECKPOINT_FILE)
+    if resume and checkpoint.get("run_id") and len(checkpoint.get("completed", [])) < len(STAGES):
+        logging.info(f"Resuming run {checkpoint['run_id']}, completed stages: {checkpoint['completed'] or 'none'}")
+        return checkpoint
+    return {"run_id": timestamp, "completed": []}
+
+def complete_stage(checkpoint, stage):
+    checkpoint["completed"].append(stage)
+    save_state(PIPELINE_CHECKPOINT_FILE, checkpoint)
+    logging.info(f"Stage {stage} completed")
+
+# Step 3: Extract into memory, the bronze files are written by the background executor
+def run_extract(plaid_creds, run_id, background, metadata):
+    client = extract.get_plaid_client(plaid_creds)
+    items = extract.get_items(plaid_creds)
+    logging.info(f"Extracting {len(items)} item(s) with {plaid_creds['max_workers']} worker(s)")
+
+    try:
+        extracted, errors = extract.extract_all_items(client, plaid_creds, items, run_id, extract.extract_item_in_memory)
+    finally:
+        extract.add_api_stats(metadata, client.stats)
+    # Bronze file order is the order silver stages them in
+    extracted.sort(key=lambda e: e["filename"])
+
+    metadata["records_extracted"] = sum(transaction_count(e["records"].counts) for e in extracted)
+    metadata["file_written_to"] = ";".join(e["filename"] for e in extracted)
+    if errors:
+        metadata["error_message"] = " | ".join(errors)
+        metadata["status"] = "PARTIAL" if extracted else "FAILED"
+    else:
+        metadata["status"] = "SUCCESS"
+    logging.info(f"{len(extracted)}/{len(items)} item(s) extracted")
+
+    bronze_futures = [background.submit(extract.persist_bronze, e) for e in extracted]
+    return extracted, bronze_futures
+
+# Step 4: Silver transform, older backlog from disk first, then this run's records straight from memory
+# while their bronze files are still being written. The cleaned transactions go to spill files, not into memory.
+# Load batch ids are built from attempt_id, the timestamp of this attempt, never from the (resumed) run id:
+# an interrupted attempt may already have registered <run_id>_000, <run_id>_001, ...
+def transform_silver(db_creds, attempt_id, extracted):
+    in_memory = {e["filename"] for e in extracted}
+    backlog = [f for f in transform.get_unprocessed_files("data/bronze") if f not in in_memory]
+    if backlog:
+        transform.run_silver(db_creds, attempt_id, backlog)
+
+    results = []
+    for e in extracted:
+        key = transform.bronze_file_key(e["filename"])
+        with span("transform_file", file=os.path.basename(e["filename"])) as s:
+            silver = transform.process_records_to_silver(
+                e["records"].records, key, db_creds["memory_limit_mb"], db_creds["silver_formats"]
+            )
+            s.rows_out = silver["transactions"]
+        results.append((e["filename"], silver))
+    return results, len(backlog)
+
+# Step 5: Stage this run's files in bronze order, the silver manifest points at the bronze files
+# so this only runs once they are on disk
+def stage_silver(db_creds, attempt_id, results, first_index):
+    if results:
+        conn = get_connection(db_creds)
+        try:
+            for index, (filepath, silver) in enumerate(results, start=first_index):
+                transform.stage_silver_file(
+                    conn, filepath, silver, f"{attempt_id}_{index:03d}", db_creds["batch_size"]
+                )
+        finally:
+            conn.close()
+
+# === Main ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run extract, silver and gold in one process")
+    parser.add_argument("--resume", action="store_true", help="continue the last unfinished run at its first open stage")
+    args = parser.parse_args()
+
+    ts = setup_logger()
+    checkpoint = load_checkpoint(args.resume, ts)
+    run_id = checkpoint["run_id"]
+    metadata = {
+        "run_id": run_id,
+        "start_time": datetime.now().isoformat(),
+        "end_time": None,
+        "status": "FAILED",
+        "records_extracted": 0,
+        "file_written_to": None,
+        "error_message": None,
+        "api_calls": None,
+        "api_attempts": None,
+        "api_latency_seconds": None,
+        "api_retry_wait_seconds": None,
+        "api_stats": None
+    }
+    succeeded = False
+
+    try:
+        plaid_creds = extract.load_credentials()
+        # Silver and gold settings come from the same .env, one dict serves both stages
+        db_creds = {**transform.load_db_credentials(), **load.load_db_credentials()}
+
+        # Bronze files are written here while the silver transform keeps working
+        with ThreadPoolExecutor(max_workers=2) as background:
+            extracted, bronze_futures, results, first_index = [], [], [], 0
+            if "extract" not in checkpoint["completed"]:
+                set_run_context(run_id, "extract")
+                try:
+                    extracted, bronze_futures = run_extract(plaid_creds, run_id, background, metadata)
+                except Exception as e:
+                    metadata["error_message"] = str(e)
+                    raise
+                finally:
+                    metadata["end_time"] = datetime.now().isoformat()
+                    log_event("run", "extract", stage="extract", **metadata)
+                    extract.write_metadata_log(metadata)
+                if metadata["status"] == "FAILED":
+                    raise RuntimeError("Extract stage failed for every item")
+
+            if "silver" not in checkpoint["completed"]:
+                set_run_context(run_id, "silver")
+                results, first_index = transform_silver(db_creds, ts, extracted)
+
+            # Cursors only move once bronze is written, so extract counts as done after the files are on disk,
+            # from here a resumed run finds this run's files in the bronze backlog
+            for future in bronze_futures:
+                future.result()
+            extracted = None
+            if "extract" not in checkpoint["completed"]:
+                complete_stage(checkpoint, "extract")
+
+            if "silver" not in checkpoint["completed"]:
+                stage_silver(db_creds, ts, results, first_index)
+                complete_stage(checkpoint, "silver")
+
+        if "gold" not in checkpoint["completed"]:
+            set_run_context(run_id, "gold")
+            if not load.run_gold(db_creds):
+                raise RuntimeError("Gold stage did not finish every staged batch")
+            complete_stage(checkpoint, "gold")
+
+        succeeded = True
+        logging.info(f"Pipeline run {run_id} completed successfully!")
+
+    except Exception:
+        logging.error(f"Pipeline run {run_id} failed, rerun with --resume to continue", exc_info=True)
+
+    sys.exit(0 if succeeded else 1)
@@ -0,0 +1,30 @@
+import threading
+import time
+
+# === Token Bucket Rate Limiter ===
+# Shared by every worker thread so the whole extract run stays under the Plaid per-client rate limit,
+# retry.RetryingClient takes a token before every attempt
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)                       # tokens added per second
+        self.capacity = float(capacity or rate)       # max burst size
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self, tokens=1):
+        # Block until enough tokens are available, sleeping outside the lock so other threads can refill
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
@@ -0,0 +1,307 @@
+import os
+import sys
+import time
+import logging
+import threading
+import pandas as pd
+
+from db import get_connection, load_sql_credentials
+from run_log import get_run_context, span
+
+# === Reporting Aggregates ===
+# Gold.agg_* tables (DBScripts/Reporting_Aggreated_Views/ddl_reporting_aggregates.sql) hold the totals the
+# reporting views serve. The fact loaders log every fact row they write in Gold.fact_transaction_changes,
+# after every gold run the logged rows of each load batch are aggregated and added to the totals, and the
+# batch is recorded in Gold.agg_applied_batches. No report ever scans the whole fact table.
+
+DELTA_FETCH_ROWS = 50000
+
+# aggregate table -> columns the delta is grouped by
+AGGREGATES = {
+    "Gold.agg_monthly_spend": ["year", "month", "month_name"],
+    "Gold.agg_monthly_spend_per_account": ["account_id", "year", "month", "month_name"],
+    "Gold.agg_spend_by_category": ["primary_category", "detailed_category"],
+    "Gold.agg_spend_by_merchant": ["merchant_name"],
+}
+
+# Same filters and joins as the original views: posted transactions only, the category is left joined so
+# uncategorized rows still count towards month, account and merchant totals (the category view inner joins,
+# those rows are left out of its aggregate). {rows} is the change log of one batch or, to rebuild, the fact table.
+DELTA_QUERY = (
+    "SELECT r.amount, r.sign, r.merchant_name, da.account_id, dd.year, dd.month, dd.month_name, "
+    "dc.category_sk, dc.primary_category, dc.detailed_category "
+    "FROM {rows} r "
+    "JOIN Gold.dim_date dd ON r.date_sk = dd.date_sk "
+    "JOIN Gold.dim_account da ON r.account_sk = da.account_sk "
+    "LEFT JOIN Gold.dim_category dc ON r.category_sk = dc.category_sk "
+    "WHERE r.pending_flag = 0"
+)
+BATCH_CHANGES = "(SELECT * FROM Gold.fact_transaction_changes WHERE load_batch_id = ?)"
+ALL_FACTS = "(SELECT *, 1 AS sign FROM Gold.fact_transactions)"
+
+def load_db_credentials():
+    return {
+        **load_sql_credentials(),
+        # Seconds between two checks of the aggregate version, cached results are served in between
+        "cache_check_seconds": float(os.getenv("REPORT_CACHE_CHECK_SECONDS", "5"))
+    }
+
+# Load batches with logged fact changes that are not in the aggregates yet, oldest first
+def get_unapplied_batches(conn):
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT DISTINCT c.load_batch_id FROM Gold.fact_transaction_changes c "
+        "WHERE NOT EXISTS (SELECT 1 FROM Gold.agg_applied_batches a WHERE a.load_batch_id = c.load_batch_id) "
+        "ORDER BY c.load_batch_id"
+    )
+    batches = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return batches
+
+# Changes whenever a batch is applied or the aggregates are rebuilt
+def get_aggregate_version(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*), MAX(load_batch_id) FROM Gold.agg_applied_batches")
+    row = cursor.fetchone()
+    cursor.close()
+    return tuple(row)
+
+# Partial sums per fetched block, summed again at the end, so even a full rebuild stays bounded in memory.
+# A row logged with sign -1 takes its amount and its count back out of the totals.
+def aggregate_delta(conn, rows, params=()):
+    cursor = conn.cursor()
+    cursor.execute(DELTA_QUERY.format(rows=rows), params)
+    columns = [col[0] for col in cursor.description]
+    partials = {table: [] for table in AGGREGATES}
+    delta_rows = 0
+    while True:
+        rows_fetched = cursor.fetchmany(DELTA_FETCH_ROWS)
+        if not rows_fetched:
+            break
+        delta_rows += len(rows_fetched)
+        block = pd.DataFrame.from_records(rows_fetched, columns=columns)
+        block["sign"] = pd.to_numeric(block["sign"]).astype(int)
+        block["amount"] = pd.to_numeric(block["amount"]).astype(float) * block["sign"]
+        categorized = block[block["category_sk"].notna()]
+        for table, keys in AGGREGATES.items():
+            rows_df = categorized if table == "Gold.agg_spend_by_category" else block
+            partials[table].append(
+                rows_df.groupby(keys, dropna=False).agg(total_spent=("amount", "sum"), transaction_count=("sign", "sum"))
+            )
+    cursor.close()
+
+    deltas = {}
+    for table, keys in AGGREGATES.items():
+        if partials[table]:
+            deltas[table] = pd.concat(partials[table]).groupby(level=keys, dropna=False).sum().reset_index()
+    return deltas, delta_rows
+
+def none_if_na(value):
+    return None if pd.isna(value) else value
+
+# Existing groups get the delta added, new groups are inserted, groups whose last transaction was taken
+# out are deleted. Aggregate tables are small (months x accounts, categories, merchants), reading their keys is cheap.
+def apply_delta(conn, table, keys, delta_df):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(keys)} FROM {table}")
+    existing = {tuple(row) for row in cursor.fetchall()}
+
+    updates, inserts = [], []
+    for row in delta_df.itertuples(index=False):
+        key = tuple(none_if_na(getattr(row, k)) for k in keys)
+        total, count = round(float(row.total_spent), 2), int(row.transaction_count)
+        if total == 0 and count == 0:
+            continue
+        if key in existing:
+            updates.append((total, count) + tuple(v for k in key for v in (k, k)))
+        else:
+            inserts.append(key + (total, count))
+
+    if updates:
+        # NULL keys (no merchant, no category) are groups of their own, like GROUP BY treats them
+        where = " AND ".join(f"({k} = ? OR ({k} IS NULL AND ? IS NULL))" for k in keys)
+        cursor.executemany(
+            f"UPDATE {table} SET total_spent = total_spent + ?, transaction_count = transaction_count + ? WHERE {where}",
+            updates
+        )
+        cursor.execute(f"DELETE FROM {table} WHERE transaction_count <= 0")
+    if inserts:
+        columns = keys + ["total_spent", "transaction_count"]
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+            inserts
+        )
+    cursor.close()
+    return len(updates), len(inserts)
+
+def apply_deltas(conn, deltas):
+    for table, delta_df in deltas.items():
+        updated, inserted = apply_delta(conn, table, AGGREGATES[table], delta_df)
+        logging.info(f"{table}: {updated} group(s) updated, {inserted} added")
+
+# Folds the logged changes of every load batch not applied yet into the aggregates. Each batch is applied,
+# recorded in Gold.agg_applied_batches and its log rows deleted in one transaction, so a batch is added
+# exactly once and a failed refresh simply starts again with the same batch next time.
+def refresh_aggregates(conn, run_id=None):
+    run_id = run_id or get_run_context()[0]
+    batches = get_unapplied_batches(conn)
+    if not batches:
+        logging.info("Reporting aggregates are up to date")
+        return 0
+
+    total_rows = 0
+    with span("refresh_aggregates") as s:
+        for batch_id in batches:
+            try:
+                deltas, delta_rows = aggregate_delta(conn, BATCH_CHANGES, (batch_id,))
+                apply_deltas(conn, deltas)
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM Gold.fact_transaction_changes WHERE load_batch_id = ?", (batch_id,))
+                change_rows = cursor.rowcount
+                cursor.execute(
+                    "INSERT INTO Gold.agg_applied_batches (load_batch_id, run_id, change_rows, applied_at) VALUES (?, ?, ?, GETDATE())",
+                    (batch_id, run_id, change_rows)
+                )
+                cursor.close()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            total_rows += delta_rows
+            logging.info(f"Applied {change_rows} logged fact change(s) of batch {batch_id} to the reporting aggregates")
+        s.rows_in = total_rows
+    logging.info(f"Reporting aggregates refreshed with {len(batches)} load batch(es)")
+    return total_rows
+
+# Recomputes the aggregates from the whole fact table, for the first build over an already loaded fact table
+# or after the totals were changed by hand. Pending change log rows are already in the fact table, they are
+# marked applied under a rebuild marker in the same transaction.
+def rebuild_aggregates(conn, run_id=None):
+    run_id = run_id or get_run_context()[0] or time.strftime("%Y-%m-%d_%H-%M-%S")
+    with span("rebuild_aggregates") as s:
+        try:
+            cursor = conn.cursor()
+            for table in AGGREGATES:
+                cursor.execute(f"DELETE FROM {table}")
+            cursor.close()
+            deltas, s.rows_in = aggregate_delta(conn, ALL_FACTS)
+            apply_deltas(conn, deltas)
+            cursor = conn.cursor()
+            pending = get_unapplied_batches(conn)
+            for batch_id in pending:
+                cursor.execute(
+                    "INSERT INTO Gold.agg_applied_batches (load_batch_id, run_id, change_rows, applied_at) VALUES (?, ?, 0, GETDATE())",
+                    (batch_id, run_id)
+                )
+            cursor.execute("DELETE FROM Gold.fact_transaction_changes")
+            cursor.execute(
+                "INSERT INTO Gold.agg_applied_batches (load_batch_id, run_id, change_rows, applied_at) VALUES (?, ?, ?, GETDATE())",
+                (f"rebuild_{run_id}", run_id, s.rows_in)
+            )
+            cursor.close()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    logging.info(f"Reporting aggregates rebuilt from {s.rows_in} fact row(s)")
+    return s.rows_in
+
+# === Cached Reporting API ===
+# Results are cached per report and parameters. The cache belongs to one aggregate version (the applied
+# load batches), as soon as a gold run applied another batch every cached result is dropped.
+class ReportingService:
+    def __init__(self, connection_factory, check_seconds=5.0):
+        self.connection_factory = connection_factory
+        self.check_seconds = check_seconds
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.version = None
+        self.last_check = 0.0
+
+    def _check_version(self, conn):
+        now = time.monotonic()
+        if now - self.last_check < self.check_seconds:
+            return
+        version = get_aggregate_version(conn)
+        with self.lock:
+            if version != self.version:
+                if self.version is not None:
+                    logging.info(f"Reporting aggregates changed (batch {version[1]}), dropping {len(self.cache)} cached result(s)")
+                self.cache = {}
+                self.version = version
+            self.last_check = now
+
+    def _query(self, key, sql, params=()):
+        with self.lock:
+            if key in self.cache and time.monotonic() - self.last_check < self.check_seconds:
+                return self.cache[key].copy()
+        conn = self.connection_factory()
+        try:
+            self._check_version(conn)
+            with self.lock:
+                if key in self.cache:
+                    return self.cache[key].copy()
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            columns = [col[0] for col in cursor.description]
+            result = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+            cursor.close()
+        finally:
+            conn.close()
+        with self.lock:
+            self.cache[key] = result
+        return result.copy()
+
+    def monthly_spend(self):
+        return self._query(
+            ("monthly_spend",),
+            "SELECT year, month, month_name, total_spent, transaction_count FROM Gold.agg_monthly_spend ORDER BY year, month"
+        )
+
+    def spend_per_account(self, account_id=None):
+        sql = "SELECT account_id, year, month, month_name, total_spent, transaction_count FROM Gold.agg_monthly_spend_per_account"
+        if account_id is None:
+            return self._query(("spend_per_account",), sql + " ORDER BY account_id, year, month")
+        return self._query(("spend_per_account", account_id), sql + " WHERE account_id = ? ORDER BY year, month", (account_id,))
+
+    def top_categories(self, limit=10):
+        result = self._query(
+            ("categories",),
+            "SELECT primary_category, detailed_category, total_spent, transaction_count FROM Gold.agg_spend_by_category"
+        )
+        return result.sort_values("total_spent", ascending=False).head(limit).reset_index(drop=True)
+
+    def merchant_spend(self, limit=None):
+        result = self._query(
+            ("merchants",),
+            "SELECT merchant_name, total_spent, transaction_count FROM Gold.agg_spend_by_merchant"
+        )
+        result = result.sort_values("total_spent", ascending=False).reset_index(drop=True)
+        return result.head(limit) if limit else result
+
+# === Main ===
+# python scripts/reporting.py          -> refresh the aggregates and print every report
+# python scripts/reporting.py refresh  -> refresh only
+# python scripts/reporting.py rebuild  -> recompute the aggregates from the whole fact table
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    creds = load_db_credentials()
+
+    conn = get_connection(creds)
+    try:
+        if sys.argv[1:] == ["rebuild"]:
+            rebuild_aggregates(conn)
+        else:
+            refresh_aggregates(conn)
+    finally:
+        conn.close()
+
+    if sys.argv[1:] not in (["refresh"], ["rebuild"]):
+        service = ReportingService(lambda: get_connection(creds), creds["cache_check_seconds"])
+        for title, report in [
+            ("Monthly spend", service.monthly_spend()),
+            ("Spend per account", service.spend_per_account()),
+            ("Top categories", service.top_categories()),
+            ("Top merchants", service.merchant_spend(limit=10)),
+        ]:
+            print(f"\n{title}\n{report.to_string(index=False)}")
@@ -0,0 +1,192 @@
+import json
+import time
+import random
+import logging
+import threading
+
+from plaid.exceptions import ApiException
+from urllib3.exceptions import HTTPError as TransportError
+
+# === Error Classification ===
+# Plaid error code (or error type) -> base backoff in seconds, anything not listed fails on the first attempt,
+# except 5xx responses: those are retried whatever their code unless it is in NON_RETRYABLE_ERRORS.
+RETRYABLE_ERRORS = {
+    "PRODUCT_NOT_READY": 2.0,             # history still being pulled after linking
+    "NOT_READY": 2.0,                     # the /transactions/sync flavour of the same thing
+    "RATE_LIMIT_EXCEEDED": 1.0,
+    "INSTITUTION_DOWN": 2.0,
+    "INSTITUTION_NOT_RESPONDING": 2.0,
+    "PLANNED_MAINTENANCE": 5.0,
+    "INTERNAL_SERVER_ERROR": 0.5,
+    "API_ERROR": 0.5,
+    "TRANSPORT_ERROR": 0.5,               # connection reset, timeout, ...
+}
+
+# Never retried, whatever the HTTP status. The sync loop restarts from its cursor on a mutation instead.
+NON_RETRYABLE_ERRORS = {"TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION"}
+
+def classify_error(exc):
+    # Returns the code the retry decision is made on
+    if isinstance(exc, ApiException):
+        try:
+            body = json.loads(exc.body or "{}")
+        except (TypeError, ValueError):
+            body = {}
+        code = body.get("error_code")
+        if code in NON_RETRYABLE_ERRORS:
+            return code
+        if code in RETRYABLE_ERRORS:
+            return code
+        if body.get("error_type") in RETRYABLE_ERRORS:
+            return body["error_type"]
+        if exc.status == 429:
+            return "RATE_LIMIT_EXCEEDED"
+        if exc.status and exc.status >= 500:
+            # Any server side failure is transient as far as we can tell, the specific code is not one we know
+            return "INTERNAL_SERVER_ERROR"
+        return code or f"HTTP_{exc.status}"
+    if isinstance(exc, (TransportError, ConnectionError, TimeoutError)):
+        return "TRANSPORT_ERROR"
+    return type(exc).__name__
+
+# === Retry Policy ===
+# Exponential backoff with jitter, capped per sleep and bounded by an overall deadline per call
+class RetryPolicy:
+    def __init__(self, max_attempts=6, base_delay=None, max_delay=30.0, deadline=120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay          # overrides the per code base delay when set
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def is_retryable(self, code):
+        return code in RETRYABLE_ERRORS
+
+    def backoff(self, attempt, code):
+        # attempt is the number of attempts made so far, half of the delay is fixed and half is jitter
+        base = self.base_delay if self.base_delay is not None else RETRYABLE_ERRORS.get(code, 1.0)
+        delay = min(self.max_delay, base * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    # None when the caller should give up, the delay to sleep otherwise
+    def next_delay(self, attempt, code, started):
+        if not self.is_retryable(code) or attempt >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt, code)
+        if time.monotonic() - started + delay > self.deadline:
+            return None
+        return delay
+
+# === Call Statistics ===
+# Per endpoint latency and attempt histograms, shared by all worker threads of a run
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+def latency_bucket(ms):
+    for bound in LATENCY_BUCKETS_MS:
+        if ms <= bound:
+            return f"<={bound}"
+    return f">{LATENCY_BUCKETS_MS[-1]}"
+
+class ApiCallStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def _endpoint(self, name):
+        if name not in self.endpoints:
+            self.endpoints[name] = {
+                "calls": 0, "failed_calls": 0, "attempts": {}, "latency_ms": {},
+                "latency_seconds": 0.0, "retry_wait_seconds": 0.0, "throttle_wait_seconds": 0.0, "errors": {}
+            }
+        return self.endpoints[name]
+
+    # One HTTP request
+    def record_attempt(self, name, seconds, error_code=None, throttle_seconds=0.0):
+        with self.lock:
+            stats = self._endpoint(name)
+            bucket = latency_bucket(seconds * 1000)
+            stats["latency_ms"][bucket] = stats["latency_ms"].get(bucket, 0) + 1
+            stats["latency_seconds"] += seconds
+            stats["throttle_wait_seconds"] += throttle_seconds
+            if error_code:
+                stats["errors"][error_code] = stats["errors"].get(error_code, 0) + 1
+
+    # One logical call, after its last attempt
+    def record_call(self, name, attempts, succeeded):
+        with self.lock:
+            stats = self._endpoint(name)
+            stats["calls"] += 1
+            stats["attempts"][str(attempts)] = stats["attempts"].get(str(attempts), 0) + 1
+            if not succeeded:
+                stats["failed_calls"] += 1
+
+    def record_wait(self, name, seconds, error_code=None):
+        with self.lock:
+            stats = self._endpoint(name)
+            stats["retry_wait_seconds"] += seconds
+            if error_code:
+                stats["errors"][error_code] = stats["errors"].get(error_code, 0) + 1
+
+    def summary(self):
+        with self.lock:
+            endpoints = json.loads(json.dumps(self.endpoints))
+        for stats in endpoints.values():
+            for key in ("latency_seconds", "retry_wait_seconds", "throttle_wait_seconds"):
+                stats[key] = round(stats[key], 3)
+        return {
+            "calls": sum(s["calls"] for s in endpoints.values()),
+            "attempts": sum(int(n) * count for s in endpoints.values() for n, count in s["attempts"].items()),
+            "latency_seconds": round(sum(s["latency_seconds"] for s in endpoints.values()), 3),
+            "retry_wait_seconds": round(sum(s["retry_wait_seconds"] for s in endpoints.values()), 3),
+            "throttle_wait_seconds": round(sum(s["throttle_wait_seconds"] for s in endpoints.values()), 3),
+            "endpoints": endpoints
+        }
+
+    def log_summary(self):
+        for name, stats in sorted(self.summary()["endpoints"].items()):
+            logging.info(
+                f"{name}: {stats['calls']} call(s), attempts {stats['attempts']}, latency {stats['latency_ms']}, "
+                f"{stats['latency_seconds']}s in requests, {stats['retry_wait_seconds']}s backing off, "
+                f"{stats['throttle_wait_seconds']}s throttled, errors {stats['errors'] or 'none'}"
+            )
+
+# === Retrying Client ===
+# Wraps the PlaidApi object so every endpoint call goes through the policy, takes a rate limit token
+# before every attempt (retries included) and is recorded in the stats
+class RetryingClient:
+    def __init__(self, client, policy, stats=None, limiter=None):
+        self._client = client
+        self.retry_policy = policy
+        self.stats = stats or ApiCallStats()
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def retrying_call(*args, **kwargs):
+            started = time.monotonic()
+            attempt = 0
+            while True:
+                attempt += 1
+                throttle_start = time.monotonic()
+                if self._limiter:
+                    self._limiter.acquire()
+                call_start = time.monotonic()
+                try:
+                    result = attr(*args, **kwargs)
+                except Exception as e:
+                    code = classify_error(e)
+                    self.stats.record_attempt(name, time.monotonic() - call_start, code, call_start - throttle_start)
+                    delay = self.retry_policy.next_delay(attempt, code, started)
+                    if delay is None:
+                        self.stats.record_call(name, attempt, succeeded=False)
+                        raise
+                    logging.warning(f"{name} failed with {code}, retry {attempt}/{self.retry_policy.max_attempts - 1} in {delay:.1f}s")
+                    self.stats.record_wait(name, delay)
+                    time.sleep(delay)
+                    continue
+                self.stats.record_attempt(name, time.monotonic() - call_start, throttle_seconds=call_start - throttle_start)
+                self.stats.record_call(name, attempt, succeeded=True)
+                return result
+        return retrying_call
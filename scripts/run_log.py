@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import threading
+from time import perf_counter
+from datetime import datetime
+
+# === Structured Run Log ===
+# One append-only newline delimited JSON file for every stage, one line per event, keyed by run_id:
+#   span        timing of one function call (fetch, flatten, clean, insert, each gold step, ...)
+#   bronze_file a bronze file was staged (or failed to), the manifest itself is data/state/silver_manifest.json
+#   run         summary of a stage run (the extract control record, API call stats, ...)
+# python scripts/run_log.py [run_id] prints where the time went, per stage and function.
+
+RUN_LOG_FILE = "logs/runs/run_log.ndjson"
+_write_lock = threading.Lock()
+
+# The run context lives in the environment so worker processes of the silver stage inherit it
+def set_run_context(run_id, stage):
+    os.environ["ETL_RUN_ID"] = str(run_id)
+    os.environ["ETL_STAGE"] = stage
+
+def get_run_context():
+    return os.environ.get("ETL_RUN_ID"), os.environ.get("ETL_STAGE")
+
+# Peak resident memory of this process in MB, resource is Unix only, psutil covers Windows when installed
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+def file_size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else None
+
+def log_event(event, name, stage=None, **fields):
+    run_id, context_stage = get_run_context()
+    entry = {
+        "run_id": run_id,
+        "stage": stage or context_stage,
+        "event": event,
+        "name": name,
+        "logged_at": datetime.now().isoformat(timespec="milliseconds"),
+        **fields
+    }
+    # One write per line in append mode, lines of concurrent threads and worker processes never interleave
+    line = json.dumps(entry, default=str, separators=(",", ":")) + "\n"
+    with _write_lock:
+        os.makedirs(os.path.dirname(RUN_LOG_FILE), exist_ok=True)
+        with open(RUN_LOG_FILE, "a", encoding="utf-8") as f:
+            f.write(line)
+
+# === Timing Spans ===
+#   with span("flatten", rows_in=len(records)) as s:
+#       df = ...
+#       s.rows_out = len(df)
+# The span is logged on exit, also when the body raises (status Failed, the error is re-raised)
+class Span:
+    def __init__(self, name, rows_in=None, stage=None, **fields):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes_written = None
+        self.stage = stage
+        self.fields = fields
+
+    def __enter__(self):
+        self.started_at = datetime.now().isoformat(timespec="milliseconds")
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = perf_counter() - self._start
+        rows = self.rows_out if self.rows_out is not None else self.rows_in
+        log_event(
+            "span", self.name, self.stage,
+            started_at=self.started_at,
+            duration_seconds=round(duration, 4),
+            status="Failed" if exc_type else "Success",
+            rows_in=self.rows_in,
+            rows_out=self.rows_out,
+            rows_per_sec=round(rows / duration) if rows and duration > 0 else None,
+            bytes_written=self.bytes_written,
+            peak_rss_mb=peak_rss_mb(),
+            error=str(exc) if exc else None,
+            **self.fields
+        )
+        return False
+
+def span(name, rows_in=None, stage=None, **fields):
+    return Span(name, rows_in, stage, **fields)
+
+# === Reading the Run Log ===
+def read_run_log(event=None, run_id=None, log_file=RUN_LOG_FILE):
+    if not os.path.exists(log_file):
+        return
+    # Cheap substring test first, only matching lines are parsed
+    marker = f'"event":"{event}"' if event else None
+    with open(log_file, encoding="utf-8") as f:
+        for line in f:
+            if marker and marker not in line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if run_id and entry.get("run_id") != run_id:
+                continue
+            yield entry
+
+# Total time, calls and rows per (stage, span), slowest first
+def summarize_spans(run_id=None):
+    totals = {}
+    for entry in read_run_log("span", run_id):
+        key = (entry.get("stage"), entry["name"])
+        total = totals.setdefault(key, {"calls": 0, "seconds": 0.0, "rows": 0, "failed": 0, "peak_rss_mb": None})
+        total["calls"] += 1
+        total["seconds"] += entry.get("duration_seconds") or 0
+        total["rows"] += (entry.get("rows_out") if entry.get("rows_out") is not None else entry.get("rows_in")) or 0
+        total["failed"] += entry.get("status") == "Failed"
+        if entry.get("peak_rss_mb") is not None:
+            total["peak_rss_mb"] = max(total["peak_rss_mb"] or 0, entry["peak_rss_mb"])
+    return sorted(totals.items(), key=lambda item: item[1]["seconds"], reverse=True)
+
+if __name__ == "__main__":
+    run_id = sys.argv[1] if len(sys.argv) > 1 else None
+    print(f"{'stage':<8} {'span':<40} {'calls':>6} {'seconds':>10} {'rows':>11} {'rows/s':>10} {'peak MB':>8} {'failed':>6}")
+    for (stage, name), total in summarize_spans(run_id):
+        rps = round(total["rows"] / total["seconds"]) if total["rows"] and total["seconds"] else "-"
+        print(f"{stage or '-':<8} {name:<40} {total['calls']:>6} {total['seconds']:>10.3f} {total['rows']:>11} {rps:>10} "
+              f"{total['peak_rss_mb'] or '-':>8} {total['failed']:>6}")
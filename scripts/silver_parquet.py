@@ -0,0 +1,162 @@
+import os
+import re
+import pandas as pd
+
+from silver_schema import (
+    TRANSACTION_FIELDS, ACCOUNT_FIELDS, TRANSACTION_DTYPES, ACCOUNT_DTYPES, spec_columns, apply_dtype_plan
+)
+
+# pyarrow is optional, silver is written as CSV only without it
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+    ds = None
+
+# === Partitioned Parquet Silver Datasets ===
+# Hive style directories, one file per bronze file chunk and partition, named after the bronze file key so
+# parallel workers never collide and re-processing a bronze file replaces its own files:
+#   data/silver/parquet/transactions/year=2025/month=7/account_id=<id>/<key>-<chunk>-0.parquet
+#   data/silver/parquet/accounts/account_id=<id>/<key>-0.parquet
+# Rows are sorted by date inside every file, so the row group statistics let date filters skip row groups.
+# The accounts dataset keeps one snapshot per bronze file, like the accounts CSVs do.
+
+SILVER_PARQUET_DIR = "data/silver/parquet"
+ROW_GROUP_ROWS = 64 * 1024
+DATE_COLUMNS = ["date", "authorized_date"]
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the Parquet silver layer, install it or use SILVER_FORMAT=csv")
+
+def get_dataset_paths(base_dir=SILVER_PARQUET_DIR):
+    return os.path.join(base_dir, "transactions"), os.path.join(base_dir, "accounts")
+
+# Explicit Arrow schemas so every file of a dataset agrees, whatever a single chunk inferred
+# (an all-empty column would otherwise be written as null type, categories with different index widths)
+def arrow_type(column, dtype_plan):
+    dtype = dtype_plan.get(column)
+    if dtype == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    if dtype == "float64":
+        return pa.float64()
+    if dtype == "boolean":
+        return pa.bool_()
+    if column in DATE_COLUMNS:
+        return pa.timestamp("us")
+    return pa.string()
+
+def arrow_schema(field_spec, dtype_plan, extra_columns=()):
+    columns = spec_columns(field_spec) + list(extra_columns)
+    return pa.schema([(column, arrow_type(column, dtype_plan)) for column in columns])
+
+def transaction_partitioning():
+    return ds.partitioning(
+        pa.schema([("year", pa.int16()), ("month", pa.int8()), ("account_id", pa.string())]), flavor="hive"
+    )
+
+def account_partitioning():
+    return ds.partitioning(pa.schema([("account_id", pa.string())]), flavor="hive")
+
+def to_arrow_table(df, schema):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return table.select(schema.names).cast(schema)
+
+# Returns (files written, bytes written)
+def write_dataset(table, path, partitioning, key):
+    written = []
+    ds.write_dataset(
+        table, path, format="parquet", partitioning=partitioning,
+        basename_template=f"{key}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        max_rows_per_group=ROW_GROUP_ROWS, min_rows_per_group=min(ROW_GROUP_ROWS, max(len(table), 1)),
+        file_visitor=lambda f: written.append(f.path)
+    )
+    return len(written), sum(os.path.getsize(f) for f in written)
+
+# === Writer ===
+# Transactions are written one chunk at a time, key names the chunk (<bronze key>-<chunk>)
+def write_transactions_parquet(tx_df, key, base_dir=SILVER_PARQUET_DIR):
+    require_pyarrow()
+    if not len(tx_df):
+        return 0, 0
+    tx_path, _ = get_dataset_paths(base_dir)
+    tx_schema = arrow_schema(TRANSACTION_FIELDS, TRANSACTION_DTYPES)
+    tx_df = tx_df.sort_values("date", kind="stable")
+    table = to_arrow_table(tx_df, tx_schema)
+    dates = tx_df["date"]
+    table = table.append_column("year", pa.array(dates.dt.year.to_numpy(), pa.int16()))
+    table = table.append_column("month", pa.array(dates.dt.month.to_numpy(), pa.int8()))
+    return write_dataset(table, tx_path, transaction_partitioning(), key)
+
+def write_accounts_parquet(acc_df, key, base_dir=SILVER_PARQUET_DIR):
+    require_pyarrow()
+    if not len(acc_df):
+        return 0, 0
+    _, acc_path = get_dataset_paths(base_dir)
+    acc_schema = arrow_schema(ACCOUNT_FIELDS, ACCOUNT_DTYPES, [c for c in ["row_hash"] if c in acc_df.columns])
+    return write_dataset(to_arrow_table(acc_df, acc_schema), acc_path, account_partitioning(), key)
+
+# A bronze file transformed again may be cut into fewer chunks, its old transaction files are removed first
+def remove_silver_parquet(key, base_dir=SILVER_PARQUET_DIR):
+    tx_path, _ = get_dataset_paths(base_dir)
+    pattern = re.compile(rf"{re.escape(key)}-\d+-\d+\.parquet")
+    for root, _, names in os.walk(tx_path):
+        for name in names:
+            if pattern.fullmatch(name):
+                os.remove(os.path.join(root, name))
+
+# === Reader ===
+# Partition filter for a date range: whole year=/month= directories outside of it are never opened
+def month_range_filter(start, end):
+    expr = None
+    if start is not None:
+        expr = (ds.field("year") > start.year) | ((ds.field("year") == start.year) & (ds.field("month") >= start.month))
+    if end is not None:
+        upper = (ds.field("year") < end.year) | ((ds.field("year") == end.year) & (ds.field("month") <= end.month))
+        expr = upper if expr is None else expr & upper
+    return expr
+
+def combine(*exprs):
+    result = None
+    for expr in exprs:
+        if expr is not None:
+            result = expr if result is None else result & expr
+    return result
+
+def open_dataset(path, partitioning):
+    require_pyarrow()
+    return ds.dataset(path, format="parquet", partitioning=partitioning) if os.path.isdir(path) else None
+
+# Only the requested columns are read, partitions and row groups outside of the date range or account set are skipped.
+#   read_silver_transactions(["transaction_id", "amount"], start_date="2025-01-01", end_date="2025-03-31", account_ids=[...])
+# filter takes any extra pyarrow.dataset expression, e.g. ds.field("amount") > 100
+def read_silver_transactions(columns=None, start_date=None, end_date=None, account_ids=None, filter=None, base_dir=SILVER_PARQUET_DIR):
+    tx_path, _ = get_dataset_paths(base_dir)
+    dataset = open_dataset(tx_path, transaction_partitioning())
+    columns = columns or spec_columns(TRANSACTION_FIELDS)
+    if dataset is None:
+        return pd.DataFrame(columns=columns)
+
+    start = pd.Timestamp(start_date) if start_date is not None else None
+    end = pd.Timestamp(end_date) if end_date is not None else None
+    row_filter = combine(
+        month_range_filter(start, end),
+        ds.field("date") >= pa.scalar(start, pa.timestamp("us")) if start is not None else None,
+        ds.field("date") <= pa.scalar(end, pa.timestamp("us")) if end is not None else None,
+        ds.field("account_id").isin(list(account_ids)) if account_ids is not None else None,
+        filter
+    )
+    table = dataset.to_table(columns=columns, filter=row_filter)
+    return apply_dtype_plan(table.to_pandas(), TRANSACTION_DTYPES)
+
+def read_silver_accounts(columns=None, account_ids=None, base_dir=SILVER_PARQUET_DIR):
+    _, acc_path = get_dataset_paths(base_dir)
+    dataset = open_dataset(acc_path, account_partitioning())
+    columns = columns or spec_columns(ACCOUNT_FIELDS)
+    if dataset is None:
+        return pd.DataFrame(columns=columns)
+    row_filter = ds.field("account_id").isin(list(account_ids)) if account_ids is not None else None
+    table = dataset.to_table(columns=columns, filter=row_filter)
+    return apply_dtype_plan(table.to_pandas(), ACCOUNT_DTYPES)
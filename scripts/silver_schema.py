@@ -0,0 +1,127 @@
+import pandas as pd
+
+# === Silver Field Specs ===
+# Declarative mapping of silver column -> path inside the Plaid record
+#   "a.b"   nested key b of object a
+#   "a[0]"  first element of list a
+#   "a[]"   list a joined into one ", " separated string
+# The same specs drive flattening, schema enforcement and column order
+
+TRANSACTION_FIELDS = [
+    ("transaction_id", "transaction_id"),
+    ("account_id", "account_id"),
+    ("name", "name"),
+    ("amount", "amount"),
+    ("date", "date"),
+    ("authorized_date", "authorized_date"),
+    ("merchant_name", "merchant_name"),
+    ("category", "category[]"),
+    ("category_id", "category_id"),
+    ("iso_currency_code", "iso_currency_code"),
+    ("payment_channel", "payment_channel"),
+    ("pending", "pending"),
+    ("counterparty_name", "counterparties[0].name"),
+    ("counterparty_type", "counterparties[0].type"),
+    ("location_city", "location.city"),
+    ("location_region", "location.region"),
+    ("location_country", "location.country"),
+    ("payment_meta_reference_number", "payment_meta.reference_number"),
+    ("payment_meta_payee", "payment_meta.payee"),
+    ("personal_finance_category_primary", "personal_finance_category.primary"),
+    ("personal_finance_category_detailed", "personal_finance_category.detailed"),
+]
+
+ACCOUNT_FIELDS = [
+    ("account_id", "account_id"),
+    ("mask", "mask"),
+    ("name", "name"),
+    ("official_name", "official_name"),
+    ("type", "type"),
+    ("subtype", "subtype"),
+    ("holder_category", "holder_category"),
+    ("balances_available", "balances.available"),
+    ("balances_current", "balances.current"),
+    ("balances_limit", "balances.limit"),
+    ("balances_iso_currency_code", "balances.iso_currency_code"),
+    ("balances_unofficial_currency_code", "balances.unofficial_currency_code"),
+]
+
+# Attributes Gold.dim_account versions on (SCD2), their hash is the only thing compared downstream
+ACCOUNT_SCD2_COLUMNS = [
+    "mask", "name", "official_name", "type", "subtype", "holder_category", "balances_iso_currency_code"
+]
+
+def spec_columns(field_spec):
+    return [column for column, _ in field_spec]
+
+# "counterparties[0].name" -> ["counterparties", 0, "name"], "category[]" -> ["category", "[]"]
+def parse_field_path(path):
+    steps = []
+    for part in path.split("."):
+        key, _, index = part.partition("[")
+        steps.append(key)
+        if index:
+            index = index.rstrip("]")
+            steps.append("[]" if index == "" else int(index))
+    return steps
+
+# === Silver Cleaning Rules ===
+# Consumed by validation.apply_rules, see there for the meaning of parse / checks / normalize
+# merchant_name, counterparty_name and payment_meta_payee are normalized by merchant_normalizer after the rules
+def _to_datetime(series):
+    return pd.to_datetime(series, errors="coerce")
+
+def _to_numeric(series):
+    return pd.to_numeric(series, errors="coerce")
+
+TRANSACTION_RULES = {
+    "transaction_id": {"checks": [("missing_transaction_id", lambda s: s.isna())]},
+    "amount": {
+        "parse": _to_numeric,
+        "checks": [("amount_not_numeric", lambda s: s.isna()), ("negative_amount", lambda s: s < 0)],
+    },
+    "date": {"parse": _to_datetime, "checks": [("unparseable_date", lambda s: s.isna())]},
+    "authorized_date": {"parse": _to_datetime},
+    "category": {"normalize": lambda s: s.astype(str).str.lower()},
+    "iso_currency_code": {"normalize": lambda s: s.fillna("USD")},
+    "payment_channel": {"normalize": lambda s: s.fillna("online")},
+}
+
+ACCOUNT_RULES = {
+    "account_id": {"checks": [("missing_account_id", lambda s: s.isna())]},
+    "balances_available": {"parse": _to_numeric},
+    "balances_current": {"parse": _to_numeric},
+    "balances_limit": {"parse": _to_numeric},
+}
+
+# === Silver Dtype Plan ===
+# Low cardinality text becomes categorical, money stays float64 (exact enough for DECIMAL(18,2) and fixed width),
+# pending is a nullable boolean. Columns not listed keep the dtype they got while flattening.
+TRANSACTION_DTYPES = {
+    "amount": "float64",
+    "category": "category",
+    "iso_currency_code": "category",
+    "payment_channel": "category",
+    "pending": "boolean",
+    "counterparty_type": "category",
+    "location_country": "category",
+    "personal_finance_category_primary": "category",
+    "personal_finance_category_detailed": "category",
+}
+
+ACCOUNT_DTYPES = {
+    "type": "category",
+    "subtype": "category",
+    "holder_category": "category",
+    "balances_available": "float64",
+    "balances_current": "float64",
+    "balances_limit": "float64",
+    "balances_iso_currency_code": "category",
+    "balances_unofficial_currency_code": "category",
+}
+
+def apply_dtype_plan(df, dtype_plan):
+    for column, dtype in dtype_plan.items():
+        if column in df.columns:
+            df[column] = df[column].astype(dtype)
+    return df
@@ -0,0 +1,31 @@
+import os
+import json
+import threading
+
+# Several threads may update the same state file, read-modify-write must not interleave
+state_lock = threading.Lock()
+
+# === Small JSON State Files ===
+# Used for the bits of pipeline state that must survive between runs (sync cursors, load checkpoints, ...)
+def load_state(state_file):
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, "r") as f:
+        return json.load(f)
+
+def save_state(state_file, state):
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    # Write to a temp file first so a crash never leaves a half written state file behind
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_file, state_file)
+
+def update_state(state_file, key, value):
+    with state_lock:
+        state = load_state(state_file)
+        if value is None:
+            state.pop(key, None)
+        else:
+            state[key] = value
+        save_state(state_file, state)
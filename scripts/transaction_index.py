@@ -0,0 +1,63 @@
+import os
+import sqlite3
+
+# === Local Transaction Index ===
+# transaction_id -> content hash of the version last loaded into Gold.fact_transactions, in a local SQLite file.
+# The rolling extract window returns mostly transactions loaded on earlier runs, only new ones and ones whose
+# content changed are staged again. The gold stage records a batch's transactions only after the fact table
+# has them, and drops the ids it deleted for Plaid's removed list, so a transaction that comes back later is
+# staged like a new one. Until gold has applied a change the transaction keeps being staged, never lost.
+# Delete the file to force every transaction to be staged on the next run.
+
+TRANSACTION_INDEX_FILE = "data/state/transaction_index.sqlite"
+LOOKUP_CHUNK = 900            # ids per IN (...) lookup, below SQLite's bound parameter limit on every build
+
+class TransactionIndex:
+    def __init__(self, path=TRANSACTION_INDEX_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS staged_transactions ("
+            "transaction_id TEXT PRIMARY KEY, row_hash TEXT NOT NULL, load_batch_id TEXT) WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # transaction_id -> row_hash for the given ids that are in the index
+    def lookup(self, transaction_ids):
+        ids = list(dict.fromkeys(transaction_ids))
+        found = {}
+        for start in range(0, len(ids), LOOKUP_CHUNK):
+            chunk = ids[start:start + LOOKUP_CHUNK]
+            rows = self.conn.execute(
+                f"SELECT transaction_id, row_hash FROM staged_transactions WHERE transaction_id IN ({', '.join(['?'] * len(chunk))})",
+                chunk
+            )
+            found.update(rows)
+        return found
+
+    def mark_loaded(self, transaction_ids, row_hashes, load_batch_id):
+        self.conn.executemany(
+            "INSERT INTO staged_transactions (transaction_id, row_hash, load_batch_id) VALUES (?, ?, ?) "
+            "ON CONFLICT(transaction_id) DO UPDATE SET row_hash = excluded.row_hash, load_batch_id = excluded.load_batch_id",
+            [(tid, row_hash, load_batch_id) for tid, row_hash in zip(transaction_ids, row_hashes)]
+        )
+        self.conn.commit()
+
+    def remove(self, transaction_ids):
+        self.conn.executemany("DELETE FROM staged_transactions WHERE transaction_id = ?", [(tid,) for tid in transaction_ids])
+        self.conn.commit()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM staged_transactions").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
@@ -1,11 +1,25 @@
-import math
 import os
-import json
+import shutil
+import hashlib
 import logging
 import pandas as pd
 from datetime import datetime
-from dotenv import load_dotenv
-import pyodbc
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+from bronze_io import iter_bronze_records, is_bronze_file, BRONZE_EXTENSIONS, TRANSACTION_RECORD_TYPES
+from db import get_connection, bulk_insert, load_sql_credentials
+from state_store import load_state, save_state, update_state
+from silver_schema import (
+    TRANSACTION_FIELDS, ACCOUNT_FIELDS, ACCOUNT_SCD2_COLUMNS, TRANSACTION_RULES, ACCOUNT_RULES, TRANSACTION_DTYPES, ACCOUNT_DTYPES,
+    spec_columns, parse_field_path, apply_dtype_plan
+)
+from validation import apply_rules, log_rule_counts, save_quarantine
+from silver_parquet import write_transactions_parquet, write_accounts_parquet, remove_silver_parquet
+from merchant_normalizer import normalize_merchant_columns, save_merchant_cache
+from transaction_index import TransactionIndex
+from run_log import set_run_context, log_event, read_run_log, span, file_size
 
 # === Setup Logging ===
 def setup_logger():
@@ -28,205 +42,500 @@ def setup_logger():
 
 # === Load Environment Variables ===
 def load_db_credentials():
-    load_dotenv()
-    #print (os.getenv("SQL_USERNAME"))
-    #print (os.getenv("SQL_PASSWORD"))
     return {
-        "server": os.getenv("SQL_SERVER"),
-        "database": os.getenv("SQL_DATABASE"),
-        "username": os.getenv("SQL_USERNAME"),
-        "password": os.getenv("SQL_PASSWORD")
+        **load_sql_credentials(),
+        "batch_size": int(os.getenv("SQL_BATCH_SIZE", "5000")),
+        "workers": int(os.getenv("SILVER_WORKERS", str(os.cpu_count() or 1))),
+        # Memory ceiling for transforming one bronze file (per worker process)
+        "memory_limit_mb": int(os.getenv("SILVER_MEMORY_LIMIT_MB", "512")),
+        # csv, parquet or csv,parquet
+        "silver_formats": get_silver_formats(os.getenv("SILVER_FORMAT", "csv"))
     }
 
-# === Extract and Flatten Counterparties ===
-def extract_counterparty_info(counterparties):
-    if isinstance(counterparties, list) and len(counterparties) > 0:
-        cp = counterparties[0]
-        return cp.get("name"), cp.get("type")
-    return None, None
-
-# === Flatten a Single Transaction Record ===
-def flatten_transaction(tx):
-    cp_name, cp_type = extract_counterparty_info(tx.get("counterparties", []))
-    loc = tx.get("location", {})
-    pmeta = tx.get("payment_meta", {})
-    pfcat = tx.get("personal_finance_category", {})
-
-    return {
-        "transaction_id": tx.get("transaction_id"),
-        "account_id": tx.get("account_id"),
-        "name": tx.get("name"),
-        "amount": tx.get("amount"),
-        "date": tx.get("date"),
-        "authorized_date": tx.get("authorized_date"),
-        "merchant_name": tx.get("merchant_name"),
-        "category": ', '.join(tx.get("category") if isinstance(tx.get("category"), list) else []),
-        "category_id": tx.get("category_id"),
-        "iso_currency_code": tx.get("iso_currency_code"),
-        "payment_channel": tx.get("payment_channel"),
-        "pending": tx.get("pending"),
-        "counterparty_name": cp_name,
-        "counterparty_type": cp_type,
-        "location_city": loc.get("city"),
-        "location_region": loc.get("region"),
-        "location_country": loc.get("country"),
-        "payment_meta_reference_number": pmeta.get("reference_number"),
-        "payment_meta_payee": pmeta.get("payee"),
-        "personal_finance_category_primary": pfcat.get("primary"),
-        "personal_finance_category_detailed": pfcat.get("detailed"),
-    }
+def get_silver_formats(value):
+    formats = tuple(f.strip().lower() for f in value.split(",") if f.strip())
+    unknown = set(formats) - {"csv", "parquet"}
+    if unknown:
+        raise ValueError(f"Unknown SILVER_FORMAT {', '.join(sorted(unknown))}, use csv, parquet or csv,parquet")
+    return formats
+
+# === Columnar Flattening ===
+# Resolve one field path for all records at once, column by column instead of building a dict per record
+def resolve_field_path(frame, steps):
+    key = steps[0]
+    if key not in frame.columns:
+        return pd.Series(None, index=frame.index, dtype=object)
+
+    series = frame[key]
+    for step in steps[1:]:
+        if series.dtype != object:
+            series = series.astype(object)
+        if step == "[]":
+            series = series.str.join(", ").fillna("")
+        else:
+            series = series.str.get(step)
+    return series
+
+def flatten_records(records, field_spec):
+    # Only the top level keys the spec needs are materialized, nested values stay as they are until resolved
+    top_level_keys = list(dict.fromkeys(parse_field_path(path)[0] for _, path in field_spec))
+    frame = pd.DataFrame.from_records(records, columns=top_level_keys) if records else pd.DataFrame(columns=top_level_keys)
+
+    columns = {}
+    for column, path in field_spec:
+        series = resolve_field_path(frame, parse_field_path(path))
+        # Missing values are None like the raw JSON, not a mix of NaN and None
+        if series.dtype == object:
+            series = series.where(series.notna(), None)
+        columns[column] = series
+    return pd.DataFrame(columns, index=frame.index)
 
 # === To get account data ===
 def get_account_details(accounts):
-    acc_data = pd.json_normalize(accounts)
-    acc_df = pd.DataFrame(acc_data)
-   
-
-    acc_df.columns = [col.replace(".", "_") for col in acc_df.columns]
-    
-    #print(acc_df.columns)
+    acc_df = flatten_records(accounts, ACCOUNT_FIELDS)
+    acc_df["row_hash"] = compute_row_hash(acc_df, ACCOUNT_SCD2_COLUMNS)
     return acc_df
 
+# === SCD2 Row Hash ===
+# MD5 over the tracked attributes joined with a separator that can't appear in the data, NULL hashes like ''
+# (same as the ISNULL(x, '') comparison it replaces in Gold.sp_upsert_dim_account)
+def compute_row_hash(df, columns):
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+    values = df[columns].astype(object)
+    values = values.where(values.notna(), "").astype(str)
+    joined = values[columns[0]].str.cat([values[col] for col in columns[1:]], sep="\x1f")
+    return joined.map(lambda text: hashlib.md5(text.encode("utf-8")).hexdigest())
+
+# === Account Change Snapshot ===
+# Last staged row_hash per account_id, accounts whose hash didn't change are not staged again.
+# Delete the file to force every account to be staged on the next run.
+ACCOUNT_HASH_FILE = "data/state/account_hashes.json"
+
+def filter_changed_accounts(acc_df):
+    snapshot = load_state(ACCOUNT_HASH_FILE)
+    changed = acc_df["row_hash"] != acc_df["account_id"].map(snapshot)
+    logging.info(f"{changed.sum()} of {len(acc_df)} account(s) are new or changed")
+    return acc_df[changed].copy()
+
+def save_account_hashes(acc_df):
+    if acc_df.empty:
+        return
+    snapshot = load_state(ACCOUNT_HASH_FILE)
+    snapshot.update(dict(zip(acc_df["account_id"], acc_df["row_hash"])))
+    save_state(ACCOUNT_HASH_FILE, snapshot)
+
+# === Transaction Change Filter ===
+# Same idea for transactions, backed by the local transaction index (see transaction_index.py)
+# since the rolling window repeats far more transactions than there are accounts
+TRANSACTION_HASH_COLUMNS = spec_columns(TRANSACTION_FIELDS)
+
+# The row_hash column travels through staging, gold records it in the index once the transaction is loaded
+def filter_changed_transactions(tx_df, index):
+    row_hash = compute_row_hash(tx_df, TRANSACTION_HASH_COLUMNS)
+    loaded_hash = tx_df["transaction_id"].map(index.lookup(tx_df["transaction_id"]))
+    changed = (row_hash != loaded_hash).to_numpy(dtype=bool)
+    logging.info(f"{changed.sum()} of {len(tx_df)} transaction(s) are new or changed")
+    tx_df = tx_df[changed].copy()
+    tx_df["row_hash"] = row_hash[changed]
+    return tx_df
+
 
 # === Enforce Schema ===
-def enforce_schema(df, expected_columns):
+def enforce_schema(df, field_spec, extra_columns=()):
+    expected_columns = spec_columns(field_spec) + list(extra_columns)
     for col in expected_columns:
         if col not in df.columns:
             df[col] = None
     return df[expected_columns]
 
-# === Process and Save to Silver Layer ===
-def process_json_to_silver(filepath, timestamp):
-    with open(filepath, 'r') as f:
-        raw_data = json.load(f)
-
-    transactions = raw_data.get("transactions", [])
-    accounts = raw_data.get("accounts", [])
-
-    tx_data = [flatten_transaction(tx) for tx in transactions]
-    tx_df = pd.DataFrame(tx_data)
-
-    # Cleaning and transformations
-    expected_tx_cols = [
-        "transaction_id", "account_id", "name", "amount", "date", "authorized_date", "merchant_name",
-        "category", "category_id", "iso_currency_code", "payment_channel", "pending",
-        "counterparty_name", "counterparty_type", "location_city", "location_region", "location_country",
-        "payment_meta_reference_number", "payment_meta_payee", "personal_finance_category_primary",
-        "personal_finance_category_detailed"
-    ]
-    tx_df = enforce_schema(tx_df, expected_tx_cols)
-    tx_df = tx_df[tx_df["amount"].apply(lambda x: isinstance(x, (int, float)) and x >= 0)]
-    tx_df["date"] = pd.to_datetime(tx_df["date"], errors="coerce")
-    tx_df["authorized_date"] = pd.to_datetime(tx_df["authorized_date"], errors="coerce")
-    tx_df["merchant_name"] = tx_df["merchant_name"].astype(str).str.strip().str.lower()
-    tx_df["category"] = tx_df["category"].astype(str).str.lower()
-    tx_df["iso_currency_code"] = tx_df["iso_currency_code"].fillna("USD")
-    tx_df["payment_channel"] = tx_df["payment_channel"].fillna("online")
-    tx_df = tx_df[~tx_df["date"].isnull()]
-
-    expected_accx_df_cols = ["account_id", "mask", "name", "official_name", "type", "subtype",
-       "holder_category", "balances_available", "balances_current",
-       "balances_limit", "balances_iso_currency_code",
-       "balances_unofficial_currency_code"]
-    
-
-    acc_df = get_account_details(accounts)
-    acc_df = enforce_schema(acc_df, expected_accx_df_cols)
-
-    # Ensure numeric columns are coerced properly
-    acc_df['balances_available'] = pd.to_numeric(acc_df['balances_available'], errors='coerce')
-    acc_df['balances_current'] = pd.to_numeric(acc_df['balances_current'], errors='coerce')
-    acc_df['balances_limit'] = pd.to_numeric(acc_df['balances_limit'], errors='coerce')
-    float_cols = ['balances_available', 'balances_current', 'balances_limit']
-    for col in float_cols:
-        acc_df[col] = acc_df[col].apply(lambda x: None if pd.isna(x) else x)
-
-    acc_df = acc_df.replace({pd.NA: None, pd.NaT: None, float('nan'): None, 'nan': None, 'NaN': None})
-    acc_df = acc_df.where(pd.notnull(acc_df), None)
-    tx_df = tx_df.where(pd.notnull(tx_df), None)
-
-    for col in ['balances_available', 'balances_current', 'balances_limit']:
-        acc_df[col] = acc_df[col].astype(float)
-
+# === Memory Budget ===
+# Rough size of one raw Plaid transaction held as Python dicts, measured on sandbox data (~6.5 KB)
+RAW_BYTES_PER_ROW = 8 * 1024
+
+# Raw records and the intermediate frames of one chunk get half of the budget, the compact result the rest
+def get_chunk_rows(memory_limit_mb):
+    return max(1000, int(memory_limit_mb * 1024 * 1024 / 2 / RAW_BYTES_PER_ROW))
+
+# === Clean One Chunk of Transactions ===
+def clean_transactions(transactions):
+    with span("flatten", rows_in=len(transactions)):
+        tx_df = flatten_records(transactions, TRANSACTION_FIELDS)
+    with span("clean", rows_in=len(tx_df)) as s:
+        tx_df = enforce_schema(tx_df, TRANSACTION_FIELDS)
+        tx_df, tx_rejected, rule_counts = apply_rules(tx_df, TRANSACTION_RULES)
+        s.rows_out = len(tx_df)
+    with span("normalize_merchants", rows_in=len(tx_df)):
+        tx_df = normalize_merchant_columns(tx_df)
+    tx_df = apply_dtype_plan(tx_df, TRANSACTION_DTYPES)
+    return tx_df, tx_rejected, rule_counts
+
+# === Silver Files ===
+def get_silver_paths(timestamp):
     silver_dir = "data/silver"
     os.makedirs(silver_dir, exist_ok=True)
     tx_csv = os.path.join(silver_dir, f"transactions_clean_{timestamp}.csv")
     acc_csv = os.path.join(silver_dir, f"accounts_clean_{timestamp}.csv")
-    tx_df.to_csv(tx_csv, index=False)
-    acc_df.to_csv(acc_csv, index=False)
+    return tx_csv, acc_csv
+
+# === Silver Spill Files ===
+# Cleaned chunks are pickled here instead of being kept in memory, staging reads them back one at a time.
+# A file's spill directory is emptied whenever it is transformed again and removed once it is staged.
+SILVER_SPILL_DIR = "data/silver/spill"
+
+def get_spill_dir(key):
+    spill_dir = os.path.join(SILVER_SPILL_DIR, key)
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    os.makedirs(spill_dir)
+    return spill_dir
+
+def remove_spill(silver):
+    shutil.rmtree(silver["spill_dir"], ignore_errors=True)
+
+def iter_silver_chunks(silver):
+    for path in silver["tx_chunks"]:
+        yield pd.read_pickle(path)
+
+# Writes the silver CSV and/or Parquet files chunk by chunk from the spill files
+def save_silver_files(silver, silver_formats):
+    tx_csv, acc_csv = get_silver_paths(silver["key"])
+    acc_df = silver["acc_df"]
+    if "parquet" in silver_formats:
+        remove_silver_parquet(silver["key"])
+    for n, tx_df in enumerate(iter_silver_chunks(silver)):
+        if "csv" in silver_formats:
+            with span("csv_write", rows_in=len(tx_df)) as s:
+                written = file_size(tx_csv) if n else 0
+                tx_df.to_csv(tx_csv, mode="a" if n else "w", header=not n, index=False)
+                s.bytes_written = file_size(tx_csv) - written
+        if "parquet" in silver_formats:
+            with span("parquet_write", rows_in=len(tx_df)) as s:
+                _, s.bytes_written = write_transactions_parquet(tx_df, f"{silver['key']}-{n:03d}")
+    if "csv" in silver_formats:
+        with span("csv_write", rows_in=len(acc_df)) as s:
+            acc_df.to_csv(acc_csv, index=False)
+            s.bytes_written = file_size(acc_csv)
+        logging.info(f"Saved cleaned transactions to {tx_csv}")
+        logging.info(f"Saved cleaned accounts to {acc_csv}")
+    if "parquet" in silver_formats:
+        with span("parquet_write", rows_in=len(acc_df)) as s:
+            _, s.bytes_written = write_accounts_parquet(acc_df, silver["key"])
+        logging.info("Saved cleaned transactions and accounts to the Parquet datasets")
+
+# === Process and Save to Silver Layer ===
+# Transactions are streamed in and cleaned in chunks sized from memory_limit_mb, every cleaned chunk is
+# spilled to disk, so only one chunk of raw records and one compact chunk are alive at a time.
+# records is any iterable of (record_type, record), from a bronze file or straight from the extract stage.
+# Returns a small dict with the spill files, the accounts frame and the counts, never the transactions themselves.
+def process_records_to_silver(records, timestamp, memory_limit_mb=512, silver_formats=("csv",)):
+    chunk_rows = get_chunk_rows(memory_limit_mb)
+    spill_dir = get_spill_dir(timestamp)
+
+    tx_chunks, chunk_sizes = [], []
+    rule_counts = {}
+    raw_count = passed_count = rejected_count = superseded_count = removed_count = 0
+    transactions, accounts, removed_ids = [], [], []
+    # transaction_id -> last chunk it appears in. Any id can come back in a later chunk: as "modified", on a shifted
+    # get-mode page or further down a legacy file, only ids are kept here, never records
+    last_chunk, dirty_chunks = {}, set()
+
+    def flush_chunk():
+        nonlocal rejected_count, passed_count, superseded_count
+        tx_chunk, rejected, chunk_counts = clean_transactions(transactions)
+        passed = len(tx_chunk)
+        # A transaction added and modified within the same chunk is kept in its last version
+        tx_chunk = tx_chunk.drop_duplicates("transaction_id", keep="last").reset_index(drop=True)
+        passed_count += passed
+        superseded_count += passed - len(tx_chunk)
+        chunk_mb = tx_chunk.memory_usage(deep=True).sum() / (1024 * 1024)
+        if chunk_mb > memory_limit_mb / 2:
+            raise RuntimeError(
+                f"A cleaned chunk of {len(tx_chunk)} transactions uses {chunk_mb:.1f} MB, "
+                f"more than half of the {memory_limit_mb} MB memory limit, raise SILVER_MEMORY_LIMIT_MB"
+            )
+        path = os.path.join(spill_dir, f"chunk_{len(tx_chunks):04d}.pkl")
+        tx_chunk.to_pickle(path)
+        tx_chunks.append(path)
+        chunk_sizes.append(len(tx_chunk))
+        save_quarantine(rejected, "transactions", timestamp, append=rejected_count > 0)
+        rejected_count += len(rejected)
+        for name, count in chunk_counts.items():
+            rule_counts[name] = rule_counts.get(name, 0) + count
+        transactions.clear()
+
+    for record_type, record in records:
+        if record_type in TRANSACTION_RECORD_TYPES:
+            transaction_id = record.get("transaction_id")
+            # The earlier version sits in an already spilled chunk, that chunk drops it later
+            if last_chunk.get(transaction_id, len(tx_chunks)) < len(tx_chunks):
+                dirty_chunks.add(last_chunk[transaction_id])
+            last_chunk[transaction_id] = len(tx_chunks)
+            transactions.append(record)
+            raw_count += 1
+            if len(transactions) >= chunk_rows:
+                flush_chunk()
+        elif record_type == "account":
+            accounts.append(record)
+        elif record_type == "removed":
+            removed_ids.append(record.get("transaction_id"))
+    if transactions or not tx_chunks:
+        flush_chunk()
+    save_merchant_cache()
+
+    # A transaction added on one sync page and modified on a later one (or repeated on a later page) is staged once,
+    # in its last version.
+    # Plaid's removed list travels with the result to staging, where it is applied to the transaction index.
+    # A transaction added and removed within the same extract is not staged at all.
+    removed = set(removed_ids)
+    for n, path in enumerate(tx_chunks):
+        if not removed and n not in dirty_chunks:
+            continue
+        tx_chunk = pd.read_pickle(path)
+        ids = tx_chunk["transaction_id"]
+        superseded = ids.astype(object).map(last_chunk).fillna(-1).to_numpy() > n
+        is_removed = ids.isin(removed).to_numpy()
+        keep = ~(is_removed | superseded)
+        removed_count += int(is_removed.sum())
+        superseded_count += int((superseded & ~is_removed).sum())
+        if not keep.all():
+            tx_chunk = tx_chunk[keep].reset_index(drop=True)
+            tx_chunk.to_pickle(path)
+            chunk_sizes[n] = len(tx_chunk)
+    # Only validation failures count as quarantined, superseded and removed versions passed validation
+    log_rule_counts("transactions", raw_count, passed_count, rule_counts)
+    if superseded_count or removed_count:
+        logging.info(
+            f"Dropped {superseded_count} superseded and {removed_count} removed transaction(s), {sum(chunk_sizes)} left to stage"
+        )
 
-    logging.info(f"Saved cleaned transactions to {tx_csv}")
-    logging.info(f"Saved cleaned accounts to {acc_csv}")
-    return tx_df, acc_df, tx_csv, acc_csv
+    acc_df = get_account_details(accounts)
+    acc_df = enforce_schema(acc_df, ACCOUNT_FIELDS, ["row_hash"])
+    raw_count = len(acc_df)
+    acc_df, acc_rejected, acc_rule_counts = apply_rules(acc_df, ACCOUNT_RULES)
+    acc_df = apply_dtype_plan(acc_df, ACCOUNT_DTYPES)
+    log_rule_counts("accounts", raw_count, len(acc_df), acc_rule_counts)
+    save_quarantine(acc_rejected, "accounts", timestamp)
+    logging.info(f"Spilled {sum(chunk_sizes)} transactions in {len(tx_chunks)} chunk(s) of up to {chunk_rows} rows to {spill_dir}")
+
+    silver = {
+        "key": timestamp, "spill_dir": spill_dir, "tx_chunks": tx_chunks, "transactions": sum(chunk_sizes),
+        "acc_df": acc_df, "removed_ids": removed_ids
+    }
+    save_silver_files(silver, silver_formats)
+    return silver
+
+def process_json_to_silver(filepath, timestamp, memory_limit_mb=512, silver_formats=("csv",)):
+    # Bronze records are read one line at a time, legacy .json files are still supported
+    return process_records_to_silver(iter_bronze_records(filepath), timestamp, memory_limit_mb, silver_formats)
 
 # === Insert Data into SQL Server ===
-def insert_into_sql(df, table_name, creds):
-    conn_str = (
-        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-        f"SERVER={creds['server']};"
-        f"DATABASE={creds['database']};"
-        f"UID={creds['username']};"
-        f"PWD={creds['password']}"
-    )
+def insert_into_sql(df, table_name, conn, batch_size=5000):
     try:
-        with pyodbc.connect(conn_str) as conn:
-            cursor = conn.cursor()
-            for index, row in df.iterrows():
-                placeholders = ', '.join(['?'] * len(row))
-                columns = ', '.join(row.index)
-                sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-
-                # Force convert float NaN to None
-                values = [
-                    None if (isinstance(val, float) and math.isnan(val)) else val
-                    for val in row.values
-                ]
-                cursor.execute(sql, *values)
-            conn.commit()
+        with span("insert", rows_in=len(df), table=table_name) as s:
+            s.rows_out = bulk_insert(conn, df, table_name, batch_size=batch_size)
         logging.info(f"Inserted data into SQL Server table: {table_name}")
     except Exception as e:
         logging.error(f"Failed to insert into {table_name}: {e}")
-        print(sql)
-
-# === Update Metadata Log ===
-def update_metadata_log(filename, record_count, status, timestamp):
-    metadata_file = "logs/silver/metadata_log.csv"
-    os.makedirs(os.path.dirname(metadata_file), exist_ok=True)
-    log_entry = {
-        "filename": filename,
-        "timestamp": timestamp,
-        "records": record_count,
-        "status": status
-    }
-    df = pd.DataFrame([log_entry])
-    if os.path.exists(metadata_file):
-        df.to_csv(metadata_file, mode='a', header=False, index=False)
-    else:
-        df.to_csv(metadata_file, index=False)
-    logging.info(f"Metadata logged for {filename}")
+        raise
+
+# === Load Batches ===
+# Every bronze file is staged as its own batch, named after the timestamp of the silver attempt and the file position.
+# The batch id of a file being staged is remembered until the batch is registered. A rerun after a failed
+# attempt keeps that id and first removes whatever the attempt left in both staging tables (one transaction),
+# then stages the file from scratch: the frames of a rerun can differ, row counts are no resume point.
+# A new id that is already registered belongs to another file's batch and is never staged into.
+LOAD_CHECKPOINT_FILE = "data/state/silver_load_checkpoint.json"
+
+def is_batch_registered(conn, batch_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM Silver.load_batches WHERE load_batch_id = ?", (batch_id,))
+    registered = cursor.fetchone()[0] > 0
+    cursor.close()
+    return registered
+
+def clear_staged_batch(conn, batch_id):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM Silver.stg_transactions WHERE load_batch_id = ?", (batch_id,))
+        transactions = cursor.rowcount
+        cursor.execute("DELETE FROM Silver.stg_accounts WHERE load_batch_id = ?", (batch_id,))
+        accounts = cursor.rowcount
+        cursor.execute("DELETE FROM Silver.stg_removed_transactions WHERE load_batch_id = ?", (batch_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    logging.info(f"Removed {transactions} transaction(s) and {accounts} account(s) of the failed attempt at batch {batch_id}")
+
+def get_batch_id(conn, run_key, new_batch_id):
+    checkpoint_key = f"{run_key}|load_batch_id"
+    batch_id = load_state(LOAD_CHECKPOINT_FILE).get(checkpoint_key)
+    if batch_id and is_batch_registered(conn, batch_id):
+        # The earlier attempt got as far as registering the batch, gold owns it, the file is staged again as a new batch
+        batch_id = None
+    elif batch_id:
+        clear_staged_batch(conn, batch_id)
+    if not batch_id:
+        if is_batch_registered(conn, new_batch_id):
+            raise RuntimeError(f"Load batch {new_batch_id} is already registered, {run_key} needs a batch id of its own")
+        batch_id = new_batch_id
+        update_state(LOAD_CHECKPOINT_FILE, checkpoint_key, batch_id)
+    return batch_id
+
+# Gold only picks up batches registered here, so it never reads a batch that is still being staged
+def mark_batch_staged(conn, batch_id, run_key):
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO Silver.load_batches (load_batch_id, source_file, status) VALUES (?, ?, 'Staged')",
+        (batch_id, run_key)
+    )
+    conn.commit()
+    cursor.close()
+    update_state(LOAD_CHECKPOINT_FILE, f"{run_key}|load_batch_id", None)
+    logging.info(f"Staged load batch {batch_id} for {run_key}")
+
+# === Bronze Backlog ===
+# The manifest is a small state file, bronze file name -> load batch it was staged in, updated as every file
+# is staged. It is built once from the run log and the old silver metadata log when it doesn't exist yet,
+# after that the run log is never scanned for it.
+SILVER_MANIFEST_FILE = "data/state/silver_manifest.json"
+LEGACY_MANIFEST_FILE = "logs/silver/metadata_log.csv"
+
+# Older entries were written on Windows with backslashes, compare by file name only
+def manifest_name(filepath):
+    return os.path.basename(filepath.replace("\\", "/"))
+
+def build_manifest(legacy_manifest=LEGACY_MANIFEST_FILE):
+    manifest = {}
+    if os.path.exists(legacy_manifest):
+        log_df = pd.read_csv(legacy_manifest, dtype=str)
+        for _, row in log_df[log_df["status"] == "Success"].iterrows():
+            manifest[manifest_name(row["filename"])] = row.get("load_batch_id") if pd.notna(row.get("load_batch_id")) else ""
+    for entry in read_run_log("bronze_file"):
+        if entry.get("status") == "Success":
+            manifest[manifest_name(entry["name"])] = entry.get("load_batch_id") or ""
+    save_state(SILVER_MANIFEST_FILE, manifest)
+    logging.info(f"Built the silver manifest with {len(manifest)} staged bronze file(s)")
+    return manifest
+
+def get_processed_files():
+    if not os.path.exists(SILVER_MANIFEST_FILE):
+        return set(build_manifest())
+    return set(load_state(SILVER_MANIFEST_FILE))
+
+def mark_file_processed(filepath, batch_id):
+    update_state(SILVER_MANIFEST_FILE, manifest_name(filepath), batch_id)
+
+def get_unprocessed_files(bronze_dir="data/bronze"):
+    processed = get_processed_files()
+    files = sorted([f for f in os.listdir(bronze_dir) if is_bronze_file(f) and f not in processed])
+    return [os.path.join(bronze_dir, f) for f in files]
+
+# transactions_2025-07-20_13-50-30_<item>.ndjson.gz -> 2025-07-20_13-50-30_<item>
+def bronze_file_key(filepath):
+    name = os.path.basename(filepath)
+    for ext in BRONZE_EXTENSIONS:
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return name.replace("transactions_", "", 1)
+
+# Runs in a worker process, the silver and spill files are named after the bronze file so parallel workers never collide.
+# Only the small result dict travels back to the parent, the transactions stay in the spill files.
+def transform_bronze_file(filepath, memory_limit_mb=512, silver_formats=("csv",)):
+    logging.info(f"Processing file: {filepath}")
+    with span("transform_file", file=os.path.basename(filepath)) as s:
+        silver = process_json_to_silver(filepath, bronze_file_key(filepath), memory_limit_mb, silver_formats)
+        s.rows_out = silver["transactions"]
+    return filepath, silver
+
+# Transform in parallel but hand results back strictly in bronze file order,
+# only a bounded window of files is in flight so finished spill files don't pile up on disk.
+# Every worker stays within memory_limit_mb, the results it hands back hold no transactions.
+def transform_in_order(files, max_workers, memory_limit_mb=512, silver_formats=("csv",)):
+    if max_workers <= 1 or len(files) <= 1:
+        for filepath in files:
+            yield transform_bronze_file(filepath, memory_limit_mb, silver_formats)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        remaining = iter(files)
+        for filepath in islice(remaining, max_workers * 2):
+            pending.append(executor.submit(transform_bronze_file, filepath, memory_limit_mb, silver_formats))
+        while pending:
+            result = pending.popleft().result()
+            for filepath in islice(remaining, 1):
+                pending.append(executor.submit(transform_bronze_file, filepath, memory_limit_mb, silver_formats))
+            yield result
+
+# === Stage One Bronze File ===
+# The transactions are read back from the spill files and inserted one chunk at a time.
+# Plaid's removed ids are staged too, gold deletes them from the fact table.
+def stage_silver_file(conn, filepath, silver, new_batch_id, batch_size=5000):
+    records = silver["transactions"]
+    removed_ids = list(dict.fromkeys(silver["removed_ids"]))
+    staged = 0
+    index = TransactionIndex()
+    try:
+        run_key = os.path.basename(filepath)
+        batch_id = get_batch_id(conn, run_key, new_batch_id)
+        # Checked here in bronze order, not in the workers, so every file is compared with what gold loaded before it
+        acc_df = filter_changed_accounts(silver["acc_df"])
+        for tx_df in iter_silver_chunks(silver):
+            tx_df = filter_changed_transactions(tx_df, index)
+            tx_df.insert(0, "load_batch_id", batch_id)
+            insert_into_sql(tx_df, "Silver.stg_transactions", conn, batch_size)
+            staged += len(tx_df)
+        acc_df.insert(0, "load_batch_id", batch_id)
+        insert_into_sql(acc_df, "Silver.stg_accounts", conn, batch_size)
+        removed_df = pd.DataFrame({"load_batch_id": batch_id, "transaction_id": pd.Series(removed_ids, dtype=object)})
+        insert_into_sql(removed_df, "Silver.stg_removed_transactions", conn, batch_size)
+        mark_batch_staged(conn, batch_id, run_key)
+        save_account_hashes(acc_df)
+        mark_file_processed(filepath, batch_id)
+    except Exception as e:
+        # The caller stops here so later files are never staged ahead of an earlier one, they stay in the backlog
+        log_event("bronze_file", filepath, records=records, status="Failed", error=str(e))
+        raise
+    finally:
+        index.close()
+        # A file that failed is transformed again on the next run, its spill files are rewritten then
+        remove_spill(silver)
+    log_event(
+        "bronze_file", filepath, records=records, staged=staged, removed=len(removed_ids),
+        status="Success", load_batch_id=batch_id
+    )
+    logging.info(f"Manifest updated for {filepath}")
+
+# === Silver Stage ===
+# Transform the given bronze files (in parallel) and stage them in order over one connection
+def run_silver(creds, timestamp, files, first_index=0):
+    logging.info(f"{len(files)} bronze file(s) to process with {creds['workers']} worker(s)")
+    # One connection is reused for all files and both staging tables
+    conn = get_connection(creds)
+    try:
+        results = transform_in_order(files, creds["workers"], creds["memory_limit_mb"], creds["silver_formats"])
+        for index, (filepath, silver) in enumerate(results, start=first_index):
+            stage_silver_file(conn, filepath, silver, f"{timestamp}_{index:03d}", creds["batch_size"])
+    finally:
+        conn.close()
+    return len(files)
 
 # === Main ===
 if __name__ == "__main__":
     try:
         ts = setup_logger()
+        set_run_context(ts, "silver")
         creds = load_db_credentials()
 
-        bronze_dir = "data/bronze"
-        files = sorted([f for f in os.listdir(bronze_dir) if f.endswith(".json")])
-        latest_file = os.path.join(bronze_dir, files[-1]) if files else None
-
-        if not latest_file:
-            logging.warning("No JSON file found in bronze layer.")
+        files = get_unprocessed_files("data/bronze")
+        if not files:
+            logging.warning("No unprocessed bronze file found in bronze layer.")
             exit()
 
-        logging.info(f"Processing file: {latest_file}")
-        tx_df, acc_df, tx_csv, acc_csv = process_json_to_silver(latest_file, ts)
-
-        insert_into_sql(tx_df, "Silver.stg_transactions", creds)
-        insert_into_sql(acc_df, "Silver.stg_accounts", creds)
-
-        update_metadata_log(latest_file, len(tx_df), "Success", ts)
-
+        run_silver(creds, ts, files)
         logging.info("Silver layer completed successfully!")
 
     except Exception as e:
@@ -0,0 +1,50 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+
+# === Rule Based Validation ===
+# Rules are grouped by column: every column is parsed once, all of its checks run on that parsed column,
+# and failing rows are split off with the reason instead of being silently filtered out.
+#   rules = {column: {"parse": fn(series) -> series,
+#                     "checks": [(rule_name, fn(series) -> mask of failing rows)],
+#                     "normalize": fn(series) -> series  (applied to valid rows only)}}
+# Parsed columns are written back into df, the row split below is the only copy of the frame.
+def apply_rules(df, rules):
+    failed = np.zeros(len(df), dtype=bool)
+    reasons = np.full(len(df), "", dtype=object)
+    rule_counts = {}
+
+    for column, rule in rules.items():
+        if "parse" in rule:
+            df[column] = rule["parse"](df[column])
+        for rule_name, check in rule.get("checks", []):
+            mask = check(df[column]).fillna(False).to_numpy(dtype=bool)
+            rule_counts[rule_name] = int(mask.sum())
+            failed |= mask
+            reasons = np.where(mask, reasons + rule_name + ";", reasons)
+
+    quarantine_df = df[failed].copy()
+    quarantine_df["reject_reason"] = pd.Series(reasons[failed], index=quarantine_df.index, dtype=object).str.rstrip(";")
+    clean_df = df[~failed].copy()
+
+    for column, rule in rules.items():
+        if "normalize" in rule:
+            clean_df[column] = rule["normalize"](clean_df[column])
+
+    return clean_df, quarantine_df, rule_counts
+
+def log_rule_counts(entity, total, clean_count, rule_counts):
+    summary = ", ".join(f"{name}={count}" for name, count in rule_counts.items())
+    logging.info(f"Validated {total} {entity}: {clean_count} passed, {total - clean_count} quarantined ({summary})")
+
+# === Quarantine Output ===
+# append adds the rows of a later chunk to the file the first chunk started
+def save_quarantine(quarantine_df, entity, timestamp, quarantine_dir="data/quarantine", append=False):
+    if quarantine_df.empty:
+        return None
+    os.makedirs(quarantine_dir, exist_ok=True)
+    path = os.path.join(quarantine_dir, f"{entity}_rejected_{timestamp}.csv")
+    quarantine_df.to_csv(path, mode="a" if append else "w", header=not append, index=False)
+    logging.info(f"Saved {len(quarantine_df)} rejected {entity} to {path}")
+    return path
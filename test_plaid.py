@@ -12,10 +12,13 @@ load_dotenv()
 client_id = os.getenv("PLAID_CLIENT_ID")
 secret = os.getenv("PLAID_SECRET")
 plaid_env = os.getenv("PLAID_ENV", "sandbox")
+# PLAID_HOST points the check at another host, e.g. the local stand-in in benchmarks/plaid_standin.py,
+# the shipped .env leaves it empty which counts as unset
+plaid_host = os.getenv("PLAID_HOST") or "https://sandbox.plaid.com"
 
 # Step 1: Setup Plaid Configuration 
 configuration = Configuration(
-    host="https://sandbox.plaid.com",  # Using sandbox environment
+    host=plaid_host,  # Sandbox unless PLAID_HOST says otherwise
     api_key={
         'clientId': client_id,
         'secret': secret,